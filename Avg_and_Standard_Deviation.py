@@ -2,6 +2,8 @@
 
 import numpy as np
 
+from analysis import describe
+
 # Data for Stop-and-Wait Protocol
 data_StopAndWait = np.array([
     [1111953.4812432, 0.0005690, 1563.8664629],
@@ -46,8 +48,7 @@ data_TCPReno = np.array([
 
 # Function to compute average and standard deviation
 def compute_statistics(data, protocol_name):
-    avg = np.mean(data, axis=0)
-    std_dev = np.std(data, axis=0, ddof=1)  # ddof=1 for sample standard deviation
+    avg, std_dev = describe(data)  # ddof=1 for sample standard deviation
     print(f"========= {protocol_name} =========")
     print(f"Average Throughput (bytes/s): {avg[0]:.2f}")
     print(f"Standard Deviation Throughput: {std_dev[0]:.2f}")
@@ -56,9 +57,11 @@ def compute_statistics(data, protocol_name):
     print(f"Average Metric Performance: {avg[2]:.2f}")
     print(f"Standard Deviation Metric Performance: {std_dev[2]:.2f}")
     print("=====================================\n")
+    return avg, std_dev
 
-# Compute and print statistics for each protocol
-compute_statistics(data_StopAndWait, "Stop-and-Wait Protocol")
-compute_statistics(data_FixSlidingWindow, "Fixed Sliding Window (100 packets)")
-compute_statistics(data_TCPReno, "TCP Reno")
+if __name__ == "__main__":
+    # Compute and print statistics for each protocol
+    compute_statistics(data_StopAndWait, "Stop-and-Wait Protocol")
+    compute_statistics(data_FixSlidingWindow, "Fixed Sliding Window (100 packets)")
+    compute_statistics(data_TCPReno, "TCP Reno")
 
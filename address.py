@@ -0,0 +1,79 @@
+import os
+import socket
+import stat
+from collections import namedtuple
+'''
+    Stream socket addresses for the proxy, its clients and backends
+
+    One string selects the socket family:
+        "127.0.0.1:7000"        TCP (AF_INET, or AF_INET6 for "[::1]:7000")
+        "unix:/tmp/proxy.sock"  Unix domain stream socket (AF_UNIX)
+
+    When the proxy, client and backend share a host, Unix sockets skip the
+    loopback TCP/IP stack (no checksums, segmentation or ACK processing).
+'''
+
+UNIX_PREFIX = "unix:"
+
+
+class Address(namedtuple('Address', 'family target')):
+    """`target` is what connect()/bind() take: a (host, port) tuple or a filesystem path."""
+    __slots__ = ()
+
+    def __str__(self):
+        if self.family == socket.AF_UNIX:
+            return UNIX_PREFIX + self.target
+        host, port = self.target[:2]
+        return f"[{host}]:{port}" if ':' in host else f"{host}:{port}"
+
+
+def parse_address(text):
+    """Address from "host:port" or "unix:/path"."""
+    if isinstance(text, Address):
+        return text
+    if text.startswith(UNIX_PREFIX):
+        path = text[len(UNIX_PREFIX):]
+        if not path:
+            raise ValueError(f"empty socket path in {text!r}")
+        return Address(socket.AF_UNIX, path)
+    host, sep, port = text.rpartition(':')
+    if not sep or not port.isdigit():
+        raise ValueError(f"expected host:port or unix:/path, got {text!r}")
+    if host.startswith('[') and host.endswith(']'):
+        return Address(socket.AF_INET6, (host[1:-1], int(port)))
+    return Address(socket.AF_INET, (host, int(port)))
+
+
+def connect(address, timeout=None):
+    """Connected stream socket to `address` (an Address or a string)."""
+    address = parse_address(address)
+    if address.family != socket.AF_UNIX:
+        return socket.create_connection(address.target, timeout=timeout)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(timeout)
+        sock.connect(address.target)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+def listen(address, backlog=128):
+    """Listening stream socket. A stale Unix socket file left by an earlier run is replaced."""
+    address = parse_address(address)
+    if address.family != socket.AF_UNIX:
+        return socket.create_server(address.target, family=address.family, backlog=backlog)
+    try:
+        if stat.S_ISSOCK(os.stat(address.target).st_mode):
+            os.unlink(address.target)
+    except FileNotFoundError:
+        pass
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.bind(address.target)
+        sock.listen(backlog)
+    except OSError:
+        sock.close()
+        raise
+    return sock
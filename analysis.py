@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+import argparse
+import glob
+import os
+from dataclasses import dataclass
+
+import numpy as np
+
+import pkttrace
+'''
+    Shared analysis module
+
+    One place for the statistics the project reports, built to work on many runs
+    at once instead of hand-pasted 10x3 arrays:
+
+        load_runs()      concatenate run results (.csv/.npz/.parquet from
+                         benchmark.py) or per-packet traces (.bin from pkttrace)
+                         into one dict of numpy columns
+        grouped_stats()  count, mean, sample std, percentiles and bootstrap CIs of
+                         the mean per protocol x parameter group, in one
+                         vectorized pass (bincount/lexsort, no per-group loop)
+        describe()       mean and sample std of an N x M array, as used by
+                         Avg_and_Standard_Deviation.py and data_plot_analysis.py
+        plot_bars()      the project's bar chart with error bars
+
+    Figures are built on matplotlib.figure.Figure when an output path is given, so
+    rendering to PNG/SVG never needs a display; pyplot is only used for show().
+
+    Example:
+        python analysis.py results/*.csv --by protocol loss --plot summary.svg
+'''
+
+RUN_METRICS = ["throughput", "avg_delay", "performance_metric"]
+
+# Mirrors pkttrace.RECORD ('<dBqId'); numpy structured dtypes are unpadded by default.
+TRACE_DTYPE = np.dtype([('t', '<f8'), ('event', 'u1'), ('offset', '<i8'), ('length', '<u4'), ('value', '<f8')])
+
+
+def describe(data):
+    """Column means and sample standard deviations (ddof=1) of an N x M array."""
+    data = np.asarray(data, dtype=float)
+    return np.mean(data, axis=0), np.std(data, axis=0, ddof=1)
+
+
+# ---------------------------------------------------------------------------
+# Loading
+# ---------------------------------------------------------------------------
+
+def load_trace(path):
+    with open(path, 'rb') as f:
+        magic, version, size = pkttrace.FILE_HEADER.unpack(f.read(pkttrace.FILE_HEADER.size))
+    if magic != pkttrace.MAGIC or size != TRACE_DTYPE.itemsize:
+        raise ValueError(f"{path} is not a version {pkttrace.FORMAT_VERSION} packet trace")
+    return np.fromfile(path, dtype=TRACE_DTYPE, offset=pkttrace.FILE_HEADER.size)
+
+
+def _load_columns(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".npz":
+        with np.load(path) as data:
+            return {name: data[name] for name in data.files}
+    if ext == ".bin":
+        trace = load_trace(path)
+        return {name: trace[name] for name in TRACE_DTYPE.names}
+    if ext in (".csv", ".parquet"):
+        try:
+            import pandas as pd  # Optional; much faster than genfromtxt on large CSVs
+        except ImportError:
+            if ext == ".parquet":
+                raise
+            table = np.genfromtxt(path, delimiter=",", names=True, dtype=None, encoding="utf-8")
+            return {name: np.atleast_1d(table[name]) for name in table.dtype.names}
+        frame = pd.read_csv(path) if ext == ".csv" else pd.read_parquet(path)
+        return {name: frame[name].to_numpy() for name in frame.columns}
+    raise ValueError(f"unsupported results format: {path}")
+
+
+def load_runs(paths):
+    """
+    Load and concatenate result files into {column: array}. Paths may be globs.
+    Only columns present in every file are kept; a `source` column records the file.
+    """
+    files = [match for path in paths for match in (sorted(glob.glob(path)) or [path])]
+    parts = [_load_columns(path) for path in files]
+    if not parts:
+        return {}
+    names = [name for name in parts[0] if all(name in part for part in parts)]
+    columns = {name: np.concatenate([part[name] for part in parts]) for name in names}
+    columns["source"] = np.repeat(np.array(files), [len(part[names[0]]) for part in parts])
+    return columns
+
+
+# ---------------------------------------------------------------------------
+# Grouped statistics
+# ---------------------------------------------------------------------------
+
+@dataclass
+class GroupedStats:
+    by: list            # Grouping column names
+    keys: dict          # column -> (G,) key values, one entry per group
+    metrics: list
+    percentiles: list
+    count: np.ndarray   # (G, M) non-NaN observations
+    mean: np.ndarray    # (G, M)
+    std: np.ndarray     # (G, M) sample standard deviation, NaN when count < 2
+    quantiles: np.ndarray  # (G, M, P)
+    ci_low: np.ndarray  # (G, M) bootstrap CI of the mean, NaN when disabled
+    ci_high: np.ndarray
+
+    def __len__(self):
+        return len(self.count)
+
+    def label(self, g):
+        return ", ".join(f"{name}={self.keys[name][g]}" for name in self.by) or "all"
+
+    def table(self):
+        """One dict per group x metric, convenient for printing or csv.DictWriter."""
+        rows = []
+        for g in range(len(self)):
+            for m, metric in enumerate(self.metrics):
+                row = {name: self.keys[name][g] for name in self.by}
+                row.update(metric=metric, n=int(self.count[g, m]), mean=self.mean[g, m], std=self.std[g, m],
+                           ci_low=self.ci_low[g, m], ci_high=self.ci_high[g, m])
+                row.update({f"p{p:g}": self.quantiles[g, m, i] for i, p in enumerate(self.percentiles)})
+                rows.append(row)
+        return rows
+
+
+def _factorize(columns, by, n_rows):
+    """Dense group id per row plus the key values of each group, ordered by key."""
+    if not by:
+        return np.zeros(n_rows, dtype=np.int64), {}
+    uniques, codes = zip(*(np.unique(columns[name], return_inverse=True) for name in by))
+    shape = [len(u) for u in uniques]
+    flat = np.ravel_multi_index([c.ravel() for c in codes], shape)
+    present, group = np.unique(flat, return_inverse=True)
+    key_codes = np.unravel_index(present, shape)
+    return group.ravel(), {name: uniques[i][key_codes[i]] for i, name in enumerate(by)}
+
+
+def _bootstrap_mean_ci(values, group, start, count, resamples, confidence, rng, max_draws=5_000_000,
+                       max_group_draws=10_000):
+    """
+    Percentile bootstrap CI of each group's mean. `values` must be sorted by
+    `group`. Every resample draws k = min(count[g], max_group_draws) indices
+    inside each group's slice. When k < count[g], the resampled means' deviations
+    from the group mean are scaled by sqrt(k / count[g]), the standard error of a
+    mean of count[g] rows. This keeps the cost independent of the trace length.
+    Resamples are processed in chunks of at most `max_draws` draws.
+    """
+    n_groups = len(count)
+    draws = np.minimum(count, max_group_draws)
+    draw_group = np.repeat(np.arange(n_groups), draws)
+    n_draws = len(draw_group)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mu = np.bincount(group, weights=values, minlength=n_groups) / count
+        shrink = np.sqrt(draws / count)
+    means = np.empty((resamples, n_groups))
+    chunk = max(1, max_draws // max(n_draws, 1))
+    offsets = start[draw_group]
+    sizes = count[draw_group]
+    for b0 in range(0, resamples, chunk):
+        b = min(chunk, resamples - b0)
+        picks = offsets + (rng.random((b, n_draws)) * sizes).astype(np.int64)
+        slots = (np.arange(b)[:, None] * n_groups + draw_group).ravel()
+        sums = np.bincount(slots, weights=values[picks].ravel(), minlength=b * n_groups)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means[b0:b0 + b] = mu + (sums.reshape(b, n_groups) / draws - mu) * shrink
+    alpha = (1 - confidence) / 2
+    return np.quantile(means, alpha, axis=0), np.quantile(means, 1 - alpha, axis=0)
+
+
+def grouped_stats(columns, by=("protocol",), metrics=RUN_METRICS, percentiles=(50, 90, 99),
+                  bootstrap=1000, confidence=0.95, seed=0):
+    """
+    Per-group statistics of every metric column. Rows whose metric is NaN are
+    ignored for that metric only. Set bootstrap=0 to skip the CIs. Groups
+    larger than 10k rows (per-packet traces) are bootstrapped from 10k draws
+    per resample, see _bootstrap_mean_ci().
+    """
+    by, metrics = list(by), list(metrics)
+    n_rows = len(columns[metrics[0]]) if metrics else 0
+    group, keys = _factorize(columns, by, n_rows)
+    n_groups = int(group.max()) + 1 if n_rows else 0
+    rng = np.random.default_rng(seed)
+    q = np.asarray(percentiles, dtype=float) / 100.0
+
+    shape = (n_groups, len(metrics))
+    count, mean, std = np.zeros(shape), np.full(shape, np.nan), np.full(shape, np.nan)
+    quantiles = np.full(shape + (len(q),), np.nan)
+    ci_low, ci_high = np.full(shape, np.nan), np.full(shape, np.nan)
+
+    for m, metric in enumerate(metrics):
+        x = np.asarray(columns[metric], dtype=float)
+        valid = ~np.isnan(x)
+        x, g = x[valid], group[valid]
+        n = np.bincount(g, minlength=n_groups).astype(float)
+        count[:, m] = n
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mu = np.bincount(g, weights=x, minlength=n_groups) / n
+            dev = x - mu[g]
+            var = np.bincount(g, weights=dev * dev, minlength=n_groups) / (n - 1)
+        mean[:, m] = mu
+        std[:, m] = np.where(n > 1, np.sqrt(np.where(n > 1, var, 0.0)), np.nan)
+
+        # One sort by (group, value) gives every group's order statistics.
+        order = np.lexsort((x, g))
+        x_sorted, g_sorted = x[order], g[order]
+        start = np.concatenate(([0], np.cumsum(n)[:-1])).astype(np.int64)
+        has = n > 0
+        pos = start[has, None] + q[None, :] * (n[has, None] - 1)
+        lo = np.floor(pos).astype(np.int64)
+        hi = np.ceil(pos).astype(np.int64)
+        frac = pos - lo
+        quantiles[has, m, :] = x_sorted[lo] * (1 - frac) + x_sorted[hi] * frac
+
+        if bootstrap and len(x):
+            low, high = _bootstrap_mean_ci(x_sorted, g_sorted, start, n.astype(np.int64),
+                                           bootstrap, confidence, rng)
+            ci_low[:, m], ci_high[:, m] = low, high
+
+    return GroupedStats(by, keys, metrics, [float(p) for p in percentiles],
+                        count, mean, std, quantiles, ci_low, ci_high)
+
+
+def print_stats(stats):
+    for g in range(len(stats)):
+        print(f"========= {stats.label(g)} =========")
+        for m, metric in enumerate(stats.metrics):
+            pcts = ", ".join(f"p{p:g} {stats.quantiles[g, m, i]:.7g}" for i, p in enumerate(stats.percentiles))
+            print(f"{metric}: n={int(stats.count[g, m])} mean {stats.mean[g, m]:.7g} std {stats.std[g, m]:.7g} "
+                  f"CI [{stats.ci_low[g, m]:.7g}, {stats.ci_high[g, m]:.7g}] {pcts}")
+        print("=====================================\n")
+
+
+# ---------------------------------------------------------------------------
+# Plotting
+# ---------------------------------------------------------------------------
+
+def new_figure(output, figsize):
+    """A pyplot figure for interactive use, or a backend-free Figure when saving to a file."""
+    if output:
+        from matplotlib.figure import Figure
+        return Figure(figsize=figsize)
+    import matplotlib.pyplot as plt
+    return plt.figure(figsize=figsize)
+
+
+def finish_figure(fig, output):
+    if output:
+        fig.savefig(output)  # Format follows the extension (.png, .svg, .pdf)
+    else:
+        import matplotlib.pyplot as plt
+        plt.show()
+
+
+def plot_bars(avg_all, std_all, labels, titles, suptitle, output=None):
+    """
+    One bar chart per column of avg_all (rows are bars). std_all is an array of the
+    same shape, or a list with one yerr per column (e.g. (2, N) asymmetric CI bars).
+    """
+    colors = ['skyblue', 'salmon', 'lightgreen']
+    avg_all = np.asarray(avg_all)
+    labels = [str(label) for label in labels]
+    fig = new_figure(output, (6 * len(titles), 6))
+    axs = fig.subplots(1, len(titles), squeeze=False)[0]
+
+    for i, title in enumerate(titles):
+        yerr = std_all[i] if isinstance(std_all, list) else np.asarray(std_all)[:, i]
+        axs[i].bar(labels, avg_all[:, i], yerr=yerr, capsize=5,
+                   color=[colors[j % len(colors)] for j in range(len(labels))])
+        axs[i].set_title(title)
+        axs[i].set_ylabel(title)
+        if len(labels) > 3:
+            axs[i].tick_params(axis='x', labelrotation=30)
+        axs[i].grid(True)
+
+    fig.suptitle(suptitle, fontsize=18)
+    fig.tight_layout(rect=[0, 0, 1, 0.95])
+    finish_figure(fig, output)
+
+
+def plot_grouped(stats, output=None, error="ci"):
+    """Bar chart of every metric's mean per group; error bars are the bootstrap CI or the std."""
+    if error == "ci" and not np.isnan(stats.ci_low).all():
+        errors = [np.stack([stats.mean[:, m] - stats.ci_low[:, m], stats.ci_high[:, m] - stats.mean[:, m]])
+                  for m in range(len(stats.metrics))]
+    else:
+        errors = stats.std
+    plot_bars(stats.mean, errors, [stats.label(g) for g in range(len(stats))], stats.metrics,
+              f"Mean per {' x '.join(stats.by) or 'run'}", output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Grouped statistics over benchmark results or packet traces.")
+    parser.add_argument("paths", nargs="+", help="result files or globs (.csv, .npz, .parquet, .bin)")
+    parser.add_argument("--by", nargs="*", default=["protocol"], help="grouping columns")
+    parser.add_argument("--metrics", nargs="+", default=None, help=f"default: {' '.join(RUN_METRICS)}")
+    parser.add_argument("--percentiles", nargs="+", type=float, default=[50, 90, 99])
+    parser.add_argument("--bootstrap", type=int, default=None,
+                        help="resamples for the CI of the mean (0 to skip; default 1000, 0 for .bin traces)")
+    parser.add_argument("--confidence", type=float, default=0.95)
+    parser.add_argument("--plot", help="save a bar chart (.png or .svg)")
+    args = parser.parse_args()
+
+    columns = load_runs(args.paths)
+    if args.bootstrap is None:
+        # Per-packet traces have millions of rows; their mean CI is not worth the time
+        traces = any(os.path.splitext(p)[1].lower() == ".bin" for p in args.paths)
+        args.bootstrap = 0 if traces else 1000
+    stats = grouped_stats(columns, args.by, args.metrics or RUN_METRICS, args.percentiles,
+                          args.bootstrap, args.confidence)
+    print_stats(stats)
+    if args.plot:
+        plot_grouped(stats, args.plot)
+
+
+if __name__ == "__main__":
+    main()
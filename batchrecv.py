@@ -0,0 +1,95 @@
+import socket
+import struct
+import sys
+import time
+'''
+    Batched UDP receive with kernel timestamps
+
+    recvfrom() allocates a new bytes object per datagram, and time.time() taken
+    after it returns includes however long the interpreter took to get there.
+    BatchReceiver instead:
+        * keeps a ring of preallocated buffers and fills them with recvmsg_into
+        * after one blocking receive, drains whatever else is already queued
+          with MSG_DONTWAIT, so a burst is handled in one call
+        * asks the kernel for SO_TIMESTAMPNS, the time each datagram reached the
+          socket, delivered as a control message next to it
+
+    The views handed out point into the ring and are overwritten by the next
+    batch; callers that keep a payload must copy it (bytes(view)).
+
+    Where recvmsg_into or SO_TIMESTAMPNS are missing (Windows, macOS) it falls
+    back to recvfrom_into and time.time(); `kernel_timestamps` says which one
+    is in use.
+'''
+
+if sys.platform.startswith('linux'):
+    SO_TIMESTAMPNS = getattr(socket, 'SO_TIMESTAMPNS', 35)  # asm-generic value; not exported by the socket module
+    SCM_TIMESTAMPNS = SO_TIMESTAMPNS
+else:
+    SO_TIMESTAMPNS = SCM_TIMESTAMPNS = None
+
+TIMESPEC = struct.Struct('@ll')     # struct timespec: tv_sec, tv_nsec
+_ANCILLARY_SIZE = socket.CMSG_SPACE(TIMESPEC.size) if hasattr(socket, 'CMSG_SPACE') else 0
+
+
+class BatchReceiver:
+    def __init__(self, sock, buffer_size=65535, batch=64):
+        self.sock = sock
+        self.batch = batch
+        self._buffers = [bytearray(buffer_size) for _ in range(batch)]
+        self._views = [memoryview(b) for b in self._buffers]
+        self._targets = [[b] for b in self._buffers]   # recvmsg_into's buffer list, built once per slot
+        self.lengths = [0] * batch
+        self.addresses = [None] * batch
+        self.timestamps = [0.0] * batch
+        self.kernel_timestamps = False
+        if SO_TIMESTAMPNS is not None and hasattr(sock, 'recvmsg_into'):
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, SO_TIMESTAMPNS, 1)
+                self.kernel_timestamps = True
+            except OSError:
+                pass
+
+    def _receive(self, i, flags):
+        if not self.kernel_timestamps:
+            n, addr = self.sock.recvfrom_into(self._buffers[i], 0, flags)
+            stamp = time.time()
+        else:
+            n, ancdata, _, addr = self.sock.recvmsg_into(self._targets[i], _ANCILLARY_SIZE, flags)
+            # The timestamp is the only control message we ask for
+            if ancdata and ancdata[0][1] == SCM_TIMESTAMPNS:
+                seconds, nanoseconds = TIMESPEC.unpack_from(ancdata[0][2])
+                stamp = seconds + nanoseconds * 1e-9
+            else:
+                stamp = time.time()
+        self.lengths[i] = n
+        self.addresses[i] = addr
+        self.timestamps[i] = stamp
+
+    def receive(self):
+        """
+        Block (honoring the socket timeout) for one datagram, then take any
+        others already queued, up to `batch`. Returns the number received.
+        """
+        self._receive(0, 0)
+        count = 1
+        # On a socket with a timeout Python waits out the timeout even with
+        # MSG_DONTWAIT, so drain it in non-blocking mode.
+        timeout = self.sock.gettimeout()
+        if timeout is not None:
+            self.sock.settimeout(0)
+        try:
+            while count < self.batch:
+                self._receive(count, socket.MSG_DONTWAIT)
+                count += 1
+        except (BlockingIOError, InterruptedError):
+            pass
+        finally:
+            if timeout is not None:
+                self.sock.settimeout(timeout)
+        return count
+
+    def packets(self, count):
+        """(payload view, sender address, arrival time) for the first `count` slots of the last batch."""
+        for i in range(count):
+            yield self._views[i][:self.lengths[i]], self.addresses[i], self.timestamps[i]
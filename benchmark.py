@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+import argparse
+import csv
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from analysis import describe
+'''
+    Protocol benchmark harness
+
+    Replaces the hand-copied 10x3 arrays in Avg_and_Standard_Deviation.py and
+    data_plot_analysis.py. For every protocol x file size x loss rate it runs N
+    iterations, stores one row per run in a columnar file, prints the same
+    statistics block as compute_statistics(), draws the same bar chart, and
+    optionally checks the means against a saved baseline.
+
+    Backends:
+        emulated (default) - netem.emulate_transfer on virtual time. Iteration i
+                             uses seed i, so reruns are identical. Runs in
+                             parallel across --jobs processes.
+        live               - starts receiver.py and sender.py as subprocesses on
+                             localhost and parses the sender's CSV line. Serial
+                             (both scripts use fixed ports) and loss must be 0.
+
+    Example:
+        python benchmark.py -n 10 --sizes 100000 1000000 --loss 0 0.01 \\
+            --out results.csv --plot results.png --baseline baseline.json
+'''
+
+COLUMNS = ["protocol", "file_size", "loss", "iteration",
+           "throughput", "avg_delay", "performance_metric", "p50_delay", "p99_delay", "elapsed", "intact"]
+METRICS = ["throughput", "avg_delay", "performance_metric"]
+
+# Two-sided 95% Student-t critical values by degrees of freedom; 1.96 beyond the table.
+_T95 = [12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+        2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+        2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042]
+
+
+def t_critical(df):
+    if df < 1:
+        return float('nan')
+    return _T95[df - 1] if df <= len(_T95) else 1.96
+
+
+def make_test_file(directory, size):
+    """Deterministic random payload of `size` bytes (incompressible, like the .mp3 the receiver writes)."""
+    path = os.path.join(directory, f"payload_{size}.bin")
+    if not os.path.exists(path):
+        with open(path, 'wb') as f:
+            f.write(random.Random(size).randbytes(size))
+    return path
+
+
+def run_emulated(job):
+    from netem import LinkConfig, emulate_transfer
+    from sender import SENDERS
+
+    protocol, filename, file_size, loss, iteration, link = job
+    config = LinkConfig(**dict(link, loss=loss))
+    result = emulate_transfer(SENDERS[protocol], filename, config, seed=iteration)
+    return {"protocol": protocol, "file_size": file_size, "loss": loss, "iteration": iteration,
+            "throughput": result.throughput, "avg_delay": result.avg_delay,
+            "performance_metric": result.performance_metric, "p50_delay": result.p50_delay,
+            "p99_delay": result.p99_delay, "elapsed": result.elapsed, "intact": result.intact}
+
+
+def run_live(job):
+    protocol, filename, file_size, loss, iteration, _ = job
+    if loss:
+        raise ValueError("the live backend cannot inject loss; use --backend emulated")
+    here = os.path.dirname(os.path.abspath(__file__))
+    with tempfile.TemporaryDirectory() as tmp:
+        output = os.path.join(tmp, "received.bin")
+        receiver = subprocess.Popen([sys.executable, os.path.join(here, "receiver.py"), output],
+                                    stdout=subprocess.DEVNULL)
+        try:
+            time.sleep(0.2)  # Let the receiver bind before the first packet
+            start = time.time()
+            completed = subprocess.run([sys.executable, os.path.join(here, "sender.py"), protocol, filename, "127.0.0.1"],
+                                       capture_output=True, text=True, check=True)
+            elapsed = time.time() - start
+            receiver.wait(timeout=10)
+        finally:
+            if receiver.poll() is None:
+                receiver.kill()
+        throughput, avg_delay, performance_metric = (float(v) for v in completed.stdout.strip().splitlines()[-1].split(","))
+        with open(filename, 'rb') as sent, open(output, 'rb') as received:
+            intact = sent.read() == received.read()
+    return {"protocol": protocol, "file_size": file_size, "loss": loss, "iteration": iteration,
+            "throughput": throughput, "avg_delay": avg_delay, "performance_metric": performance_metric,
+            # The sender's CSV line carries only the mean delay
+            "p50_delay": float('nan'), "p99_delay": float('nan'), "elapsed": elapsed, "intact": intact}
+
+
+def run_matrix(protocols, sizes, losses, iterations, backend="emulated", jobs=1, link=None, workdir=None):
+    workdir = workdir or tempfile.mkdtemp(prefix="bench_")
+    files = {size: make_test_file(workdir, size) for size in sizes}
+    matrix = [(protocol, files[size], size, loss, i, link or {})
+              for protocol in protocols for size in sizes for loss in losses for i in range(iterations)]
+    if backend == "live":
+        return [run_live(job) for job in matrix]
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            return list(pool.map(run_emulated, matrix, chunksize=max(1, len(matrix) // (jobs * 4))))
+    return [run_emulated(job) for job in matrix]
+
+
+def save_results(rows, path):
+    """Write rows column-wise; format is picked from the extension (.csv, .npz, .parquet)."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=COLUMNS)
+            writer.writeheader()
+            writer.writerows(rows)
+    elif ext == ".npz":
+        np.savez(path, **{c: np.array([row[c] for row in rows]) for c in COLUMNS})
+    elif ext == ".parquet":
+        import pandas as pd  # Optional dependency, only needed for Parquet output
+        pd.DataFrame(rows, columns=COLUMNS).to_parquet(path)
+    else:
+        raise ValueError(f"unsupported results format: {path}")
+
+
+def load_results(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        with open(path, newline='') as f:
+            rows = list(csv.DictReader(f))
+        for row in rows:
+            row["file_size"] = int(row["file_size"])
+            row["iteration"] = int(row["iteration"])
+            row["intact"] = row["intact"] == "True"
+            for column in ["loss", "p50_delay", "p99_delay", "elapsed"] + METRICS:
+                row[column] = float(row.get(column, "nan"))  # Quantile columns are absent from older files
+        return rows
+    if ext == ".npz":
+        with np.load(path) as data:
+            columns = {c: data[c].tolist() for c in COLUMNS}
+        return [dict(zip(COLUMNS, values)) for values in zip(*(columns[c] for c in COLUMNS))]
+    if ext == ".parquet":
+        import pandas as pd
+        return pd.read_parquet(path).to_dict("records")
+    raise ValueError(f"unsupported results format: {path}")
+
+
+def group_rows(rows, metrics=METRICS):
+    """(protocol, file_size, loss) -> N x len(metrics) array, by default [throughput, avg_delay, performance_metric]."""
+    groups = {}
+    for row in rows:
+        key = (row["protocol"], row["file_size"], row["loss"])
+        groups.setdefault(key, []).append([row[m] for m in metrics])
+    return {key: np.array(values) for key, values in groups.items()}
+
+
+def summarize(groups):
+    """Mean, sample std and 95% CI half-width per group and metric."""
+    summary = {}
+    for key, data in groups.items():
+        n = len(data)
+        if n > 1:
+            avg, std = describe(data)
+        else:
+            avg, std = data[0], np.zeros(len(METRICS))
+        half_width = t_critical(n - 1) * std / math.sqrt(n) if n > 1 else np.full(len(METRICS), float('nan'))
+        summary[key] = {"n": n, "mean": avg.tolist(), "std": std.tolist(), "ci95": half_width.tolist()}
+    return summary
+
+
+def _key_name(key):
+    protocol, file_size, loss = key
+    return f"{protocol}|{file_size}|{loss:g}"
+
+
+def save_baseline(summary, path):
+    with open(path, 'w') as f:
+        json.dump({_key_name(key): stats for key, stats in summary.items()}, f, indent=2)
+
+
+def find_regressions(summary, baseline, tolerance=0.05):
+    """
+    Compare against a saved baseline. A metric regresses when it moved in the bad
+    direction by more than `tolerance` (relative) and by more than the two 95% CIs
+    combined, so run-to-run noise alone does not trip it.
+    Higher is better for throughput and the performance metric, lower for delay.
+    """
+    regressions = []
+    for key, stats in summary.items():
+        base = baseline.get(_key_name(key))
+        if base is None:
+            continue
+        for i, metric in enumerate(METRICS):
+            old, new = base["mean"][i], stats["mean"][i]
+            worse = old - new if metric != "avg_delay" else new - old
+            noise = sum(ci for ci in (base["ci95"][i], stats["ci95"][i]) if not math.isnan(ci))
+            if old and worse > tolerance * abs(old) and worse > noise:
+                regressions.append((key, metric, old, new))
+    return regressions
+
+
+def report(summary, groups, quantiles=None):
+    from Avg_and_Standard_Deviation import compute_statistics
+
+    for key in sorted(groups):
+        protocol, file_size, loss = key
+        compute_statistics(groups[key], f"{protocol} ({file_size} bytes, loss {loss:g})")
+        stats = summary[key]
+        print(f"95% CI (n={stats['n']}): throughput +/- {stats['ci95'][0]:.2f}, "
+              f"delay +/- {stats['ci95'][1]:.8f}, metric +/- {stats['ci95'][2]:.2f}")
+        if quantiles is not None and not np.isnan(quantiles[key]).all():
+            p50, p99, elapsed = np.nanmean(quantiles[key], axis=0)
+            print(f"Mean p50 / p99 packet delay (s): {p50:.8f} / {p99:.8f}")
+            print(f"Mean completion time (s): {elapsed:.4f}")
+        print()
+
+
+def plot(summary, path):
+    from data_plot_analysis import plot_comparison
+
+    # One chart per (file_size, loss) scenario, protocols side by side.
+    scenarios = sorted({(size, loss) for _, size, loss in summary})
+    root, ext = os.path.splitext(path)
+    for size, loss in scenarios:
+        keys = sorted(key for key in summary if key[1:] == (size, loss))
+        avg_all = np.array([summary[key]["mean"] for key in keys])
+        std_all = np.array([summary[key]["std"] for key in keys])
+        output = path if len(scenarios) == 1 else f"{root}_{size}_{loss:g}{ext}"
+        plot_comparison(avg_all, std_all, labels=[key[0] for key in keys],
+                        title=f"Protocol Performance Comparison ({summary[keys[0]]['n']} Trials, "
+                              f"{size} bytes, loss {loss:g})",
+                        output=output)
+
+
+def main():
+    from sender import SENDERS
+
+    parser = argparse.ArgumentParser(description="Benchmark the senders over a protocol x size x loss matrix.")
+    parser.add_argument("--protocols", nargs="+", type=str.lower, default=list(SENDERS), choices=sorted(SENDERS))
+    parser.add_argument("--sizes", nargs="+", type=int, default=[100_000], help="file sizes in bytes")
+    parser.add_argument("--loss", nargs="+", type=float, default=[0.0], help="per-packet loss rates")
+    parser.add_argument("-n", "--iterations", type=int, default=10)
+    parser.add_argument("--backend", choices=["emulated", "live"], default="emulated")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--bandwidth", type=float, default=1_000_000, help="emulated bytes/s")
+    parser.add_argument("--delay", type=float, default=0.01, help="emulated one-way delay in seconds")
+    parser.add_argument("--input", help="skip running; load results from this file")
+    parser.add_argument("--out", help="results file (.csv, .npz or .parquet)")
+    parser.add_argument("--plot", help="save bar charts to this image path")
+    parser.add_argument("--baseline", help="baseline JSON to check for regressions")
+    parser.add_argument("--save-baseline", help="write this run's summary as a baseline JSON")
+    parser.add_argument("--tolerance", type=float, default=0.05)
+    args = parser.parse_args()
+
+    if args.input:
+        rows = load_results(args.input)
+    else:
+        link = {"bandwidth": args.bandwidth, "delay": args.delay}
+        rows = run_matrix(args.protocols, args.sizes, args.loss, args.iterations,
+                          backend=args.backend, jobs=args.jobs, link=link)
+    if args.out:
+        save_results(rows, args.out)
+
+    broken = sum(1 for row in rows if not row["intact"])
+    if broken:
+        print(f"WARNING: {broken} run(s) did not deliver the file intact")
+
+    groups = group_rows(rows)
+    summary = summarize(groups)
+    report(summary, groups, group_rows(rows, ["p50_delay", "p99_delay", "elapsed"]))
+    if args.plot:
+        plot(summary, args.plot)
+    if args.save_baseline:
+        save_baseline(summary, args.save_baseline)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = find_regressions(summary, json.load(f), args.tolerance)
+        for key, metric, old, new in regressions:
+            print(f"REGRESSION {_key_name(key)} {metric}: {old:.7f} -> {new:.7f}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
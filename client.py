@@ -8,10 +8,18 @@
     # Link: https://docs.python.org/3/library/json.html
 import socket
 import json
+import sys
+
+from address import connect, parse_address
 
 _proxy_host = '127.0.0.1'
 _proxy_port = 8000
 
+# Optional arguments: proxy address and backend address, each "host:port" or "unix:/path"
+# Usage: python client.py [proxy_address] [server_address]
+proxy_address = sys.argv[1] if len(sys.argv) > 1 else f"{_proxy_host}:{_proxy_port}"
+server_address = parse_address(sys.argv[2] if len(sys.argv) > 2 else "127.0.0.1:7000")
+
 
 # Since, the input should be accept a 4-character string as an input to be forwarded
 message = input("Enter the 4 characters message, like 'ping': ")
@@ -25,6 +33,12 @@ data = {
     "server_port": 7000,      # The serives port destination
     "message": message        # The acutal message trying to send it
 }
+if server_address.family == socket.AF_UNIX:
+    # A backend on a Unix socket is named by its full address instead
+    del data["server_ip"], data["server_port"]
+    data["server"] = str(server_address)
+else:
+    data["server_ip"], data["server_port"] = server_address.target
 
 # Convert the data to the json parse 
 # Reference: https://www.geeksforgeeks.org/json-dumps-in-python/
@@ -32,8 +46,7 @@ json_data = json.dumps(data)
 
 
 # Learning Link: https://www.geeksforgeeks.org/socket-programming-python/
-with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-    s.connect((_proxy_host, _proxy_port))
+with connect(proxy_address) as s:
     s.sendall(json_data.encode())
     response = s.recv(1024).decode()
 
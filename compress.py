@@ -0,0 +1,143 @@
+import lzma
+import socket
+import struct
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from packet import DATA_SIZE, FLAG_ACK, FLAG_SYN, PacketFormatError, recv_ack_packet
+'''
+    Per-transfer payload compression
+
+    With compression on, the senders no longer send the raw file. They send a
+    stream of frames, one per BLOCK_SIZE block of the file:
+
+        FRAME  method (B), raw length (I), body length (I)
+        body   the block compressed with `method`, or the raw block (METHOD_RAW)
+               when compressing did not make it smaller (e.g. .mp3 files)
+
+    The frame stream is cut into DATA_SIZE packets exactly like a file, so
+    offsets, ACKs, retransmits and FEC are unchanged: a packet always carries
+    the same bytes however often it is resent. Blocks are compressed in a
+    thread pool (zlib and lzma release the GIL), at most `lookahead` blocks
+    at a time. stopAndWait.py consumes the packets as they come, so it
+    compresses a few blocks ahead of the sender. The window senders
+    (fixedSlidingWindow.py, tcpReno.py) need the packet count up front, so
+    they build the whole frame stream before the first send. After
+    PROBE_AFTER blocks in a row fail to shrink, only every PROBE_EVERY-th
+    block is tried, so incompressible files cost almost no CPU.
+
+    Handshake: before the first data packet the sender sends FLAG_SYN with the
+    codec it wants; the receiver answers FLAG_SYN | FLAG_ACK with the codec it
+    will decode, or "none", in which case the file goes out raw.
+'''
+
+BLOCK_SIZE = 64 * 1024
+FRAME = struct.Struct('!BII')
+METHOD_RAW = 0
+CODECS = {  # name -> (method id, compress, decompress)
+    "zlib": (1, lambda data: zlib.compress(data, 6), zlib.decompress),
+    "lzma": (2, lambda data: lzma.compress(data, preset=1), lzma.decompress),
+}
+DECOMPRESS = {method: decompress for method, _, decompress in CODECS.values()}
+PROBE_AFTER = 4
+PROBE_EVERY = 16
+
+
+def stream_size_bound(file_size):
+    """Largest possible frame stream for a file: every block stored raw."""
+    return file_size + FRAME.size * -(-file_size // BLOCK_SIZE)
+
+
+def negotiate(sock, writer, dest_addr, codec, retries=5):
+    """SYN handshake; returns the codec the receiver agreed to, or None for a raw transfer."""
+    for _ in range(retries):
+        sock.sendto(writer.pack(0, codec.encode(), FLAG_SYN), dest_addr)
+        try:
+            reply = recv_ack_packet(sock, writer.session_id, writer.legacy)
+        except socket.timeout:
+            continue
+        if reply.flags != FLAG_SYN | FLAG_ACK:
+            raise PacketFormatError("receiver does not support compression negotiation")
+        agreed = bytes(reply.payload).decode()
+        return agreed if agreed in CODECS else None
+    raise socket.timeout(f"no answer to compression handshake after {retries} tries")
+
+
+def choose_codec(offered):
+    """Receiver side: the codec to use for a SYN payload, or None."""
+    name = bytes(offered).decode(errors='replace')
+    return name if name in CODECS else None
+
+
+def compress_block(codec, raw, attempt=True):
+    method, compress, _ = CODECS[codec]
+    if attempt:
+        body = compress(raw)
+        if len(body) < len(raw):
+            return FRAME.pack(method, len(raw), len(body)) + body
+    return FRAME.pack(METHOD_RAW, len(raw), len(raw)) + raw
+
+
+def compressed_chunks(filename, codec, data_size=DATA_SIZE, workers=None, lookahead=8):
+    """
+    Like read_file_in_chunks(), but yields (offset, data) packets of the
+    compressed frame stream. Up to `lookahead` blocks are in the pool at a
+    time, which bounds its memory whether the caller streams the packets or
+    collects them all with list().
+    """
+    pending = deque()
+    incompressible = 0      # Consecutive blocks that did not shrink
+    blocks = 0
+    buffered = bytearray()
+    offset = 0
+    with open(filename, 'rb') as f, ThreadPoolExecutor(max_workers=workers) as pool:
+        eof = False
+        while not eof or pending:
+            while not eof and len(pending) < lookahead:
+                raw = f.read(BLOCK_SIZE)
+                if not raw:
+                    eof = True
+                    break
+                attempt = incompressible < PROBE_AFTER or blocks % PROBE_EVERY == 0
+                pending.append(pool.submit(compress_block, codec, raw, attempt))
+                blocks += 1
+            if not pending:
+                break
+            frame = pending.popleft().result()
+            if frame[0] == METHOD_RAW:
+                incompressible += 1
+            else:
+                incompressible = 0
+            buffered += frame
+            while len(buffered) >= data_size:
+                yield offset, bytes(buffered[:data_size])
+                del buffered[:data_size]
+                offset += data_size
+    if buffered:
+        yield offset, bytes(buffered)
+
+
+def decode_frames(chunks):
+    """Receiver side: turn the in-order payloads of a compressed transfer back into file bytes."""
+    buffered = bytearray()
+    for chunk in chunks:
+        buffered += chunk
+        while len(buffered) >= FRAME.size:
+            method, raw_len, body_len = FRAME.unpack_from(buffered)
+            end = FRAME.size + body_len
+            if len(buffered) < end:
+                break
+            body = bytes(buffered[FRAME.size:end])
+            del buffered[:end]
+            if method == METHOD_RAW:
+                yield body
+                continue
+            if method not in DECOMPRESS:
+                raise PacketFormatError(f"unknown compression method {method}")
+            raw = DECOMPRESS[method](body)
+            if len(raw) != raw_len:
+                raise PacketFormatError(f"block decompressed to {len(raw)} bytes, expected {raw_len}")
+            yield raw
+    if buffered:
+        raise PacketFormatError(f"compressed stream ends with {len(buffered)} bytes of a partial frame")
@@ -1,5 +1,9 @@
+import sys
+
 import numpy as np
-import matplotlib.pyplot as plt
+
+import pkttrace
+from analysis import describe, finish_figure, load_trace, new_figure, plot_bars
 
 # Data for Stop-and-Wait Protocol
 data_StopAndWait = np.array([
@@ -48,27 +52,98 @@ metrics_labels = ['Throughput (bytes/s)', 'Average Packet Delay (s)', 'Performan
 
 # Compute mean and standard deviation for each metric in each protocol
 def compute_stats(data):
-    avg = np.mean(data, axis=0)
-    std = np.std(data, axis=0, ddof=1)  # Sample standard deviation
-    return avg, std
-
-avg_SW, std_SW = compute_stats(data_StopAndWait)
-avg_FS, std_FS = compute_stats(data_FixSlidingWindow)
-avg_TR, std_TR = compute_stats(data_TCPReno)
-
-# Stack the averages and stds into arrays (each row corresponds to one protocol)
-avg_all = np.array([avg_SW, avg_FS, avg_TR])
-std_all = np.array([std_SW, std_FS, std_TR])
-
-# Create bar charts with error bars for each metric
-fig, axs = plt.subplots(1, 3, figsize=(18, 6))
-
-for i in range(3):
-    axs[i].bar(protocols, avg_all[:, i], yerr=std_all[:, i], capsize=5, color=['skyblue', 'salmon', 'lightgreen'])
-    axs[i].set_title(metrics_labels[i])
-    axs[i].set_ylabel(metrics_labels[i])
-    axs[i].grid(True)
-
-plt.suptitle("Protocol Performance Comparison (10 Trials)", fontsize=18)
-plt.tight_layout(rect=[0, 0, 1, 0.95])
-plt.show()
+    return describe(data)  # Sample standard deviation (ddof=1)
+
+# Create bar charts with error bars for each metric.
+# Rows of avg_all/std_all are protocols, columns follow metrics_labels.
+# Pass `output` to save the figure instead of opening a window.
+def plot_comparison(avg_all, std_all, labels=protocols, title="Protocol Performance Comparison (10 Trials)", output=None):
+    plot_bars(avg_all, std_all, labels, metrics_labels, title, output)
+
+# ---------------------------------------------------------------------------
+# Per-packet trace analysis (files written by pkttrace.TraceRecorder)
+# ---------------------------------------------------------------------------
+
+# load_trace() lives in analysis.py so trace rows can also go through grouped_stats().
+
+def trace_event_counts(trace):
+    counts = np.bincount(trace['event'], minlength=max(pkttrace.EVENT_NAMES) + 1)
+    return {name: int(counts[code]) for code, name in pkttrace.EVENT_NAMES.items()}
+
+def trace_delay_percentiles(trace, percentiles=(50, 90, 99, 99.9)):
+    delays = trace['value'][trace['event'] == pkttrace.ACKED]
+    if len(delays) == 0:
+        return {p: float('nan') for p in percentiles}
+    return dict(zip(percentiles, np.percentile(delays, percentiles)))
+
+def trace_cwnd(trace):
+    """(time, cwnd) at every congestion window change."""
+    cwnd = trace[trace['event'] == pkttrace.CWND]
+    return cwnd['t'], cwnd['value']
+
+def trace_goodput(trace, bin_width=0.1):
+    """(bin start time, acknowledged bytes/s) over fixed time bins."""
+    acked = trace[trace['event'] == pkttrace.ACKED]
+    if len(acked) == 0:
+        return np.zeros(0), np.zeros(0)
+    t0 = trace['t'].min()
+    bins = ((acked['t'] - t0) // bin_width).astype(np.int64)
+    goodput = np.bincount(bins, weights=acked['length']) / bin_width
+    return t0 + np.arange(len(goodput)) * bin_width, goodput
+
+def plot_trace(trace, bin_width=0.1, title="Per-Packet Trace", output=None):
+    t0 = trace['t'].min() if len(trace) else 0.0
+    fig = new_figure(output, (18, 6))
+    axs = fig.subplots(1, 3)
+
+    t, cwnd = trace_cwnd(trace)
+    axs[0].step(t - t0, cwnd, where='post', color='salmon')
+    axs[0].set_title('Congestion Window')
+    axs[0].set_xlabel('Time (s)')
+    axs[0].set_ylabel('cwnd (packets)')
+
+    t, goodput = trace_goodput(trace, bin_width)
+    axs[1].plot(t - t0, goodput, color='skyblue')
+    axs[1].set_title('Goodput')
+    axs[1].set_xlabel('Time (s)')
+    axs[1].set_ylabel('Acknowledged bytes/s')
+
+    delays = np.sort(trace['value'][trace['event'] == pkttrace.ACKED])
+    axs[2].plot(delays, np.arange(1, len(delays) + 1) / max(len(delays), 1), color='lightgreen')
+    for p, v in trace_delay_percentiles(trace, (50, 99)).items():
+        axs[2].axvline(v, linestyle='--', color='gray')
+        axs[2].annotate(f"p{p:g}", (v, 0.05))
+    axs[2].set_title('Packet Delay CDF')
+    axs[2].set_xlabel('Delay (s)')
+    axs[2].set_ylabel('Fraction of packets')
+
+    for ax in axs:
+        ax.grid(True)
+    fig.suptitle(title, fontsize=18)
+    fig.tight_layout(rect=[0, 0, 1, 0.95])
+    finish_figure(fig, output)
+
+def analyze_trace(path, output=None):
+    trace = load_trace(path)
+    print(f"========= {path} =========")
+    for name, count in trace_event_counts(trace).items():
+        if count:
+            print(f"{name}: {count}")
+    for p, v in trace_delay_percentiles(trace).items():
+        print(f"p{p:g} packet delay (s): {v:.7f}")
+    print("=====================================\n")
+    plot_trace(trace, title=f"Per-Packet Trace: {path}", output=output)
+
+if __name__ == "__main__" and len(sys.argv) > 1:
+    # python data_plot_analysis.py trace.bin [plot.png]
+    analyze_trace(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None)
+elif __name__ == "__main__":
+    avg_SW, std_SW = compute_stats(data_StopAndWait)
+    avg_FS, std_FS = compute_stats(data_FixSlidingWindow)
+    avg_TR, std_TR = compute_stats(data_TCPReno)
+
+    # Stack the averages and stds into arrays (each row corresponds to one protocol)
+    avg_all = np.array([avg_SW, avg_FS, avg_TR])
+    std_all = np.array([std_SW, std_FS, std_TR])
+
+    plot_comparison(avg_all, std_all)
@@ -0,0 +1,131 @@
+import struct
+
+from packet import DATA_SIZE, HEADER_SIZE
+'''
+    XOR forward error correction
+
+    The sender groups the first transmission of every K consecutive data packets
+    into a block and follows it with one repair packet (FLAG_FEC, offset = first
+    byte of the block) whose payload is
+
+        FEC_HEADER  count (H), length of the block's last packet (H)
+        parity      XOR of the block's payloads, each zero-padded to DATA_SIZE
+
+    Every packet of a file is DATA_SIZE bytes except the last one, and a block
+    never extends past the end of the file, so packet i of a block starts at
+    offset + i * DATA_SIZE. A receiver holding all but one packet of a block plus
+    its repair rebuilds the missing one locally instead of waiting for a
+    retransmit. Repair packets can be up to FEC_HEADER.size bytes larger than
+    PACKET_SIZE; receivers read with MAX_DATAGRAM.
+
+    ACKs from a receiver that has seen repair packets carry RECOVERED (I), the
+    running count of rebuilt packets, so the sender's loss estimate also counts
+    losses that FEC hid. AdaptiveRedundancy turns that estimate into K.
+'''
+
+FEC_HEADER = struct.Struct('!HH')
+RECOVERED = struct.Struct('!I')
+MAX_DATAGRAM = HEADER_SIZE + FEC_HEADER.size + DATA_SIZE
+
+
+def _pad(data):
+    return int.from_bytes(data, 'big') << (8 * (DATA_SIZE - len(data)))
+
+
+class FecEncoder:
+    """Accumulates the parity of the current block; XOR is done on Python ints, one op per packet."""
+    def __init__(self):
+        self._parity = 0
+        self._count = 0
+        self._start = 0
+        self._last_len = 0
+
+    def __len__(self):
+        return self._count
+
+    def add(self, offset, data):
+        if self._count == 0:
+            self._start = offset
+        self._parity ^= _pad(data)
+        self._count += 1
+        self._last_len = len(data)
+
+    def flush(self):
+        """(block offset, repair payload) for the packets added so far, or None if there are none."""
+        if self._count == 0:
+            return None
+        payload = FEC_HEADER.pack(self._count, self._last_len) + self._parity.to_bytes(DATA_SIZE, 'big')
+        start = self._start
+        self._parity, self._count = 0, 0
+        return start, payload
+
+
+class FecDecoder:
+    """Receiver side: pending repairs and local reconstruction."""
+    def __init__(self, received_data):
+        self.received_data = received_data   # The receiver's offset -> payload map, filled in place
+        self.recovered = 0
+        self._repairs = {}                  # block offset -> (count, last_len, parity)
+        self._block_of = {}                 # data offset -> block offset, for pending repairs only
+
+    def _offsets(self, start, count, last_len):
+        return [(start + i * DATA_SIZE, DATA_SIZE if i < count - 1 else last_len) for i in range(count)]
+
+    def add_repair(self, start, payload):
+        """Register a repair packet; returns the offsets rebuilt (possibly none)."""
+        count, last_len = FEC_HEADER.unpack_from(payload)
+        if start in self._repairs or count == 0:
+            return []
+        parity = int.from_bytes(payload[FEC_HEADER.size:], 'big')
+        self._repairs[start] = (count, last_len, parity)
+        for offset, _ in self._offsets(start, count, last_len):
+            self._block_of[offset] = start
+        return self._try_recover(start)
+
+    def on_data(self, offset):
+        """Call after storing a data packet; returns the offsets rebuilt (possibly none)."""
+        start = self._block_of.get(offset)
+        return self._try_recover(start) if start is not None else []
+
+    def _try_recover(self, start):
+        count, last_len, parity = self._repairs[start]
+        members = self._offsets(start, count, last_len)
+        missing = [(offset, length) for offset, length in members if offset not in self.received_data]
+        if len(missing) > 1:
+            return []   # Wait for more data or retransmits
+
+        rebuilt = []
+        if missing:
+            offset, length = missing[0]
+            for other, _ in members:
+                if other != offset:
+                    parity ^= _pad(self.received_data[other])
+            self.received_data[offset] = parity.to_bytes(DATA_SIZE, 'big')[:length]
+            self.recovered += 1
+            rebuilt.append(offset)
+        del self._repairs[start]
+        for offset, _ in members:
+            self._block_of.pop(offset, None)
+        return rebuilt
+
+
+class AdaptiveRedundancy:
+    """
+    Picks the block size K from an EWMA of the loss rate, aiming for about one
+    loss per three blocks (so most blocks lose at most one packet). Higher loss
+    means smaller blocks, i.e. more repair packets per data packet.
+    """
+    def __init__(self, initial_loss=0.02, min_k=4, max_k=32, alpha=0.25):
+        self.loss = initial_loss
+        self.min_k = min_k
+        self.max_k = max_k
+        self.alpha = alpha
+
+    def update(self, sent, lost):
+        if sent > 0:
+            self.loss = (1 - self.alpha) * self.loss + self.alpha * min(lost / sent, 1.0)
+
+    def block_size(self):
+        if self.loss <= 0:
+            return self.max_k
+        return max(self.min_k, min(self.max_k, int(1 / (3 * self.loss))))
@@ -5,24 +5,21 @@
 # Metrics measured correctly over 10 iterations (3)
 # Window adjustment technique explained (2)
 
+import os
 import socket
 import time
 
-# Common definitions
-PACKET_SIZE = 1024              # Total packet size in bytes
-SEQ_ID_SIZE = 4                 # 4 bytes reserved for the sequence number header
-DATA_SIZE = PACKET_SIZE - SEQ_ID_SIZE  # Payload size per packet
+from compress import compressed_chunks, negotiate
+from metrics import DelayStats, send_time_buffer
+from packet import DATA_SIZE, FLAG_ACK, FLAG_FIN, PACKET_SIZE, PacketWriter, recv_ack
+from pkttrace import SEND, RETRANSMIT, ACK, DUP_ACK, TIMEOUT, ACKED
+
+# Common definitions (PACKET_SIZE, DATA_SIZE and the header format) live in packet.py
 
 '''
     Rubric Requirement: Sequence of packets managed correctly (3 Points)
+    Every packet carries its file offset in the 64-bit offset field (PacketWriter.pack).
 '''
-def create_packet(seq, data):
-    """
-    Create a UDP packet with a 4-byte sequence number header (signed, big-endian)
-    followed by the data.
-    """
-    return seq.to_bytes(SEQ_ID_SIZE, byteorder='big', signed=True) + data
-
 def read_file_in_chunks(filename):
     """
     Generator that reads the file in DATA_SIZE chunks.
@@ -40,19 +37,31 @@ def read_file_in_chunks(filename):
 class FixedWindowSenderWithMetrics:
     WINDOW_SIZE = 100  # Maximum number of unacknowledged packets
 
-    def __init__(self, dest_ip, dest_port=5001, timeout=0.5):
-        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        # Allow reuse of the address to avoid "address already in use" errors.
-        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        self.sock.bind(("0.0.0.0", 5002))  # Bind to a port different from 5001
+    def __init__(self, dest_ip, dest_port=5001, timeout=0.5, sock=None, clock=time.time, tracer=None, legacy=False,
+                 compress=None):
+        if compress and legacy:
+            raise ValueError("compression needs the versioned header; it cannot be combined with legacy=True")
+        # A socket-like object (e.g. netem.EmulatedSocket) can be passed in place of a real UDP socket,
+        # together with the clock that drives it.
+        if sock is None:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            # Allow reuse of the address to avoid "address already in use" errors.
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.bind(("0.0.0.0", 5002))  # Bind to a port different from 5001
+        self.sock = sock
         self.sock.settimeout(timeout)
+        self.clock = clock
+        self.tracer = tracer           # Optional pkttrace.TraceRecorder
         self.dest_addr = (dest_ip, dest_port)
-        self.start_time = time.time()  # Start throughput timer immediately
+        # Packets are built in one reused buffer; legacy=True speaks the old 4-byte-offset format
+        self.writer = PacketWriter(legacy=legacy)
+        self.compress = compress       # Requested codec ("zlib" / "lzma"), or None to send the file as is
+        self.start_time = self.clock()  # Start throughput timer immediately
 
         # Metrics variables
         self.total_bytes_sent = 0      # Count unique payload bytes successfully acknowledged
-        self.packet_send_time = {}     # Dictionary: packet offset -> first send time
-        self.packet_delays = []        # List to hold per-packet delays
+        self.packet_send_time = None   # array('d'): packet index -> first send time
+        self.delay_stats = DelayStats()  # Running mean and p50/p99 of per-packet delay
 
 
     """
@@ -74,8 +83,12 @@ class FixedWindowSenderWithMetrics:
     """
     def send_file(self, filename):
         # Read the file into a list of (offset, data) tuples
-        packets = list(read_file_in_chunks(filename))
+        # Optional compression, agreed with the receiver before any data is sent (see compress.py)
+        codec = negotiate(self.sock, self.writer, self.dest_addr, self.compress) if self.compress else None
+        chunks = read_file_in_chunks(filename) if codec is None else compressed_chunks(filename, codec)
+        packets = list(chunks)
         total_packets = len(packets)
+        self.packet_send_time = send_time_buffer(total_packets)
         base = 0        # Pointer to the first unacknowledged packet in the window
         next_index = 0  # Next packet index to send
 
@@ -84,43 +97,55 @@ class FixedWindowSenderWithMetrics:
             # Send packets while the window is not full
             while next_index < total_packets and (next_index - base) < self.WINDOW_SIZE:
                 offset, data = packets[next_index]
-                packet = create_packet(offset, data)
+                packet = self.writer.pack(offset, data)
                 # Record the first send time only once per packet
-                if offset not in self.packet_send_time:
-                    self.packet_send_time[offset] = time.time()
+                # (next_index only moves forward; timeouts resend in the loop below)
+                self.packet_send_time[next_index] = self.clock()
                 self.sock.sendto(packet, self.dest_addr)
+                if self.tracer is not None:
+                    self.tracer.record(SEND, self.clock(), offset, len(data))
                 # print(f"[FixedWindow] Sent packet: seq_id {offset}, size {len(data)} bytes")
                 next_index += 1
 
             try:
                 # Wait for a cumulative ACK from the receiver
-                ack_packet, _ = self.sock.recvfrom(PACKET_SIZE)
-                ack = int.from_bytes(ack_packet[:SEQ_ID_SIZE], byteorder='big', signed=True)
+                ack = recv_ack(self.sock, self.writer.session_id, self.writer.legacy)
                 # print(f"[FixedWindow] Received cumulative ACK: {ack}")
+                if self.tracer is not None:
+                    acked_before = base
+                    self.tracer.record(ACK, self.clock(), ack)
 
                 # Slide the window: for each packet that is acknowledged,
                 # compute its delay and update total unique bytes sent.
                 while base < total_packets:
                     offset, data = packets[base]
                     if ack >= offset + len(data):
-                        delay = time.time() - self.packet_send_time[offset]
-                        self.packet_delays.append(delay)
+                        delay = self.clock() - self.packet_send_time[base]
+                        self.delay_stats.add(delay)
                         self.total_bytes_sent += len(data)
+                        if self.tracer is not None:
+                            self.tracer.record(ACKED, self.clock(), offset, len(data), delay)
                         base += 1
                     else:
                         break
+                if self.tracer is not None and base == acked_before:
+                    self.tracer.record(DUP_ACK, self.clock(), ack)
             except socket.timeout:
+                if self.tracer is not None:
+                    self.tracer.record(TIMEOUT, self.clock(), packets[base][0])
                 #print(f"[FixedWindow] Timeout. Resending packets from index {base} to {next_index - 1}.")
                 # Resend all packets in the current window
                 for i in range(base, next_index):
                     offset, data = packets[i]
-                    packet = create_packet(offset, data)
+                    packet = self.writer.pack(offset, data)
                     self.sock.sendto(packet, self.dest_addr)
+                    if self.tracer is not None:
+                        self.tracer.record(RETRANSMIT, self.clock(), offset, len(data))
                     # print(f"[FixedWindow] Resent packet: seq_id {offset}, size {len(data)} bytes")
 
         # After all packets are sent, send an EOF packet (empty payload) with the final offset.
         final_offset = packets[-1][0] + len(packets[-1][1]) if total_packets > 0 else 0
-        eof_packet = create_packet(final_offset, b"")
+        eof_packet = self.writer.pack(final_offset)
         self.sock.sendto(eof_packet, self.dest_addr)
         # print(f"[FixedWindow] Sent EOF packet with seq_id {final_offset}")
 
@@ -134,16 +159,19 @@ class FixedWindowSenderWithMetrics:
             #print("[FixedWindow] Timeout waiting for final ACK/FIN.")
 
         # Send FINACK message to signal the receiver to exit
-        finack_packet = create_packet(0, b'==FINACK==')
+        finack_packet = self.writer.pack(0, flags=FLAG_FIN | FLAG_ACK)
         self.sock.sendto(finack_packet, self.dest_addr)
         # print("[FixedWindow] Sent FINACK message. Exiting sender.")
         self.sock.close()
 
         # Compute metrics
-        end_time = time.time()
+        end_time = self.clock()
         total_time = end_time - self.start_time
-        throughput = self.total_bytes_sent / total_time if total_time > 0 else 0.0
-        avg_delay = sum(self.packet_delays) / len(self.packet_delays) if self.packet_delays else 0.0
+        # Throughput counts file bytes delivered. With compression, total_bytes_sent is the
+        # (smaller) frame stream on the wire, and the whole file is delivered once it is all ACKed.
+        delivered = self.total_bytes_sent if codec is None else os.path.getsize(filename)
+        throughput = delivered / total_time if total_time > 0 else 0.0
+        avg_delay = self.delay_stats.mean()
         
         # Corrected performance metric:
         # 0.3 × (throughput / 1000) + 0.7 / (average per-packet delay)
@@ -154,6 +182,7 @@ class FixedWindowSenderWithMetrics:
 
         # Output the metrics; note that 10 iterations may be run externally and averaged.
         print(f"{throughput:.7f}, {avg_delay:.7f}, {performance_metric:.7f}")
+        return throughput, avg_delay, performance_metric
         # print("------------ TCP Reno ------------")
         # print(f"Throughput: {throughput:.2f} bytes/s")
         # print(f"Average delay per packet: {avg_delay:.4f} s")
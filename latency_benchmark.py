@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+import argparse
+import contextlib
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+
+import proxy_server
+from address import Address, connect, listen, parse_address
+from metrics import LatencyHistogram
+'''
+    Request latency over loopback TCP vs Unix domain sockets
+
+    Runs a pong backend and the proxy in this process, each listening on both a
+    TCP port and a Unix socket, then times sequential requests:
+
+        direct      one persistent client <-> backend connection, 4-byte ping/pong
+                    (pure transport round trip)
+        via proxy   client.py's request: new connection to the proxy, JSON
+                    header, proxy connects to the backend, response, close
+
+    Every combination of client hop and backend hop is measured, so the saving
+    of each Unix socket hop shows up separately.
+
+    Usage:
+        python latency_benchmark.py -n 5000
+'''
+
+
+def pong(conn):
+    with conn:
+        while conn.recv(1024):
+            conn.sendall(b"pong")
+
+
+def serve_pong(listener):
+    while True:
+        conn, _ = listener.accept()
+        threading.Thread(target=pong, args=(conn,), daemon=True).start()
+
+
+def start(target, address):
+    listener = listen(address)
+    threading.Thread(target=target, args=(listener,), daemon=True).start()
+    address = parse_address(address)
+    if address.family == socket.AF_UNIX:
+        return address
+    return Address(listener.family, listener.getsockname()[:2])    # Port 0 -> the port actually bound
+
+
+def time_direct(address, n):
+    histogram = LatencyHistogram()
+    with connect(address) as sock:
+        if sock.family != socket.AF_UNIX:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        for _ in range(n):
+            start = time.perf_counter_ns()
+            sock.sendall(b"ping")
+            sock.recv(1024)
+            histogram.record((time.perf_counter_ns() - start) // 1000)
+    return histogram
+
+
+def time_proxy(proxy, backend, n):
+    if backend.family == socket.AF_UNIX:
+        request = json.dumps({"server": str(backend), "message": "ping"}).encode()
+    else:
+        request = json.dumps({"server_ip": backend.target[0], "server_port": backend.target[1],
+                              "message": "ping"}).encode()
+    histogram = LatencyHistogram()
+    for _ in range(n):
+        start = time.perf_counter_ns()
+        with connect(proxy) as sock:
+            sock.sendall(request)
+            response = sock.recv(1024)
+        histogram.record((time.perf_counter_ns() - start) // 1000)
+        if response != b"pong":
+            raise RuntimeError(f"unexpected response {response!r}")
+    return histogram
+
+
+def line(name, histogram):
+    print(f"{name:<28} p50 {histogram.quantile(0.5):>6} us   p99 {histogram.quantile(0.99):>6} us   "
+          f"mean {histogram.mean():>8.1f} us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare loopback TCP and Unix socket request latency.")
+    parser.add_argument("-n", "--requests", type=int, default=2000, help="requests per scenario")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        backends = {"tcp": start(serve_pong, "127.0.0.1:0"),
+                    "unix": start(serve_pong, f"unix:{os.path.join(tmp, 'pong.sock')}")}
+        proxies = {"tcp": start(proxy_server.serve, "127.0.0.1:0"),
+                   "unix": start(proxy_server.serve, f"unix:{os.path.join(tmp, 'proxy.sock')}")}
+
+        for kind, backend in backends.items():
+            line(f"direct {kind}", time_direct(backend, args.requests))
+        # The proxy logs every request; keep that out of the timings
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            results = [(f"client {c} -> proxy -> {b}", time_proxy(proxies[c], backends[b], args.requests))
+                       for c in proxies for b in backends]
+        for name, histogram in results:
+            line(name, histogram)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+import argparse
+import asyncio
+import collections
+import json
+import multiprocessing
+import os
+import random
+import socket
+import time
+
+from address import parse_address
+from metrics import LatencyHistogram
+'''
+    Load generator for proxy_server.py (and any backend speaking the same protocol)
+
+    Each request is what client.py sends: connect, write the JSON
+    {"server_ip", "server_port", "message"} (or {"pool", "message"}, see
+    upstream.py), read the response until the proxy
+    closes the connection. Requests run as asyncio tasks, spread over --processes
+    worker processes so the client side is not limited to one core.
+
+    Modes:
+        closed  --concurrency connections per process, each sending its next
+                request as soon as the previous one completes
+        open    --rate requests/s in total at fixed (or --poisson) arrival times,
+                whether or not earlier requests have completed. Latency is
+                measured from the scheduled arrival time, so a stalled proxy
+                shows up as queueing delay instead of a lower request rate.
+
+    --proxy and --server take "host:port" or "unix:/path" (see address.py).
+
+    Latencies are recorded in microseconds into metrics.LatencyHistogram, which
+    the workers return to the parent to be merged.
+
+    Usage:
+        python loadgen.py --mode closed --concurrency 500 --processes 4 --duration 10
+        python loadgen.py --mode open --rate 20000 --processes 4 --duration 10
+'''
+
+OK = "ok"
+
+
+def raise_fd_limit():
+    # Thousands of sockets per process need more than the usual 1024 descriptors
+    try:
+        import resource
+    except ImportError:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+async def one_request(args, payload):
+    """Returns OK or an error category."""
+    try:
+        if args.proxy.family == socket.AF_UNIX:
+            opening = asyncio.open_unix_connection(args.proxy.target)
+        else:
+            opening = asyncio.open_connection(*args.proxy.target)
+        reader, writer = await asyncio.wait_for(opening, args.timeout)
+    except asyncio.TimeoutError:
+        return "connect timeout"
+    except OSError as e:
+        return f"connect: {type(e).__name__}"
+    try:
+        writer.write(payload)
+        response = await asyncio.wait_for(reader.read(), args.timeout)
+    except asyncio.TimeoutError:
+        return "response timeout"
+    except OSError as e:
+        return f"io: {type(e).__name__}"
+    finally:
+        writer.close()
+    if not response:
+        return "empty response"
+    if response.startswith(b"Error"):
+        # The proxy's own error replies, e.g. "Error: [Errno 111] Connection refused"
+        return "proxy: " + response.decode(errors='replace')[:60]
+    return OK
+
+
+async def closed_loop(args, payload, histogram, outcomes, deadline):
+    async def connection():
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            outcome = await one_request(args, payload)
+            outcomes[outcome] += 1
+            if outcome == OK:
+                histogram.record((time.perf_counter() - start) * 1e6)
+
+    await asyncio.gather(*(connection() for _ in range(args.concurrency)))
+
+
+async def open_loop(args, payload, histogram, outcomes, deadline, rate, rng):
+    async def timed(scheduled):
+        outcome = await one_request(args, payload)
+        outcomes[outcome] += 1
+        if outcome == OK:
+            histogram.record((time.perf_counter() - scheduled) * 1e6)
+
+    tasks = set()
+    scheduled = time.perf_counter()
+    while scheduled < deadline:
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        else:
+            # Behind schedule: still yield, so the requests already started get to run
+            await asyncio.sleep(0)
+        if len(tasks) >= args.max_inflight:
+            outcomes["dropped (max in-flight)"] += 1
+        else:
+            task = asyncio.create_task(timed(scheduled))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        scheduled += rng.expovariate(rate) if args.poisson else 1.0 / rate
+    if tasks:
+        await asyncio.wait(tasks)
+
+
+def worker(args, index):
+    raise_fd_limit()
+    if args.pool:
+        target = {"pool": args.pool}
+    elif args.server.family == socket.AF_UNIX:
+        target = {"server": str(args.server)}
+    else:
+        target = {"server_ip": args.server.target[0], "server_port": args.server.target[1]}
+    payload = json.dumps({**target, "message": args.message}).encode()
+    histogram = LatencyHistogram()
+    outcomes = collections.Counter()
+
+    async def run():
+        deadline = time.perf_counter() + args.duration
+        if args.mode == "closed":
+            await closed_loop(args, payload, histogram, outcomes, deadline)
+        else:
+            rng = random.Random(args.seed + index)
+            await open_loop(args, payload, histogram, outcomes, deadline, args.rate / args.processes, rng)
+
+    start = time.perf_counter()
+    asyncio.run(run())
+    return histogram, outcomes, time.perf_counter() - start
+
+
+def report(histogram, outcomes, elapsed):
+    total = sum(outcomes.values())
+    ok = outcomes[OK]
+    print(f"Requests: {total} in {elapsed:.2f} s, {ok} ok ({ok / elapsed:.1f} req/s), {total - ok} errors")
+    if histogram.count:
+        print("Latency (ms): " + ", ".join(f"p{label} {histogram.quantile(q) / 1000:.3f}" for label, q in
+                                           (("50", 0.5), ("90", 0.9), ("99", 0.99), ("99.9", 0.999))) +
+              f", mean {histogram.mean() / 1000:.3f}, max {histogram.max / 1000:.3f}")
+    for outcome, n in outcomes.most_common():
+        if outcome != OK:
+            print(f"  {n:>8}  {outcome}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Open- or closed-loop load generator for proxy_server.py.")
+    parser.add_argument("--proxy", type=parse_address, default="127.0.0.1:8000")
+    parser.add_argument("--server", type=parse_address, default="127.0.0.1:7000",
+                        help="backend named in the JSON request")
+    parser.add_argument("--pool", help="name an upstream pool of the proxy instead of --server")
+    parser.add_argument("--message", default="ping")
+    parser.add_argument("--mode", choices=["closed", "open"], default="closed")
+    parser.add_argument("--concurrency", type=int, default=100, help="closed loop: connections per process")
+    parser.add_argument("--rate", type=float, default=1000, help="open loop: total requests/s")
+    parser.add_argument("--poisson", action="store_true", help="open loop: exponential inter-arrival times")
+    parser.add_argument("--max-inflight", type=int, default=10000, help="open loop: per-process cap")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--timeout", type=float, default=5.0, help="connect and response timeout, seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    with multiprocessing.Pool(args.processes) as pool:
+        results = pool.starmap(worker, [(args, i) for i in range(args.processes)])
+    elapsed = time.perf_counter() - start
+
+    histogram = LatencyHistogram()
+    outcomes = collections.Counter()
+    for worker_histogram, worker_outcomes, worker_elapsed in results:
+        histogram.merge(worker_histogram)
+        outcomes.update(worker_outcomes)
+    # Rates over the load window, not process start-up
+    report(histogram, outcomes, max(worker_elapsed for _, _, worker_elapsed in results) or elapsed)
+
+
+if __name__ == "__main__":
+    main()
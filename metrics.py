@@ -0,0 +1,182 @@
+import math
+from array import array
+'''
+    Constant-memory metric collection for the senders
+
+    The senders used to keep a dict of send times keyed by byte offset and a list
+    with one float per packet, i.e. two Python objects per packet for the whole
+    transfer. Instead:
+        * send times live in a flat array('d') indexed by packet number
+          (offset // DATA_SIZE), allocated once per transfer
+        * delays are folded into a running sum/count plus P^2 quantile
+          estimators (Jain & Chlamtac, 1985), five markers per quantile. Each
+          keeps the first samples exactly until there are enough to place
+          its markers (100, more for quantiles beyond 1%/99%)
+
+    LatencyHistogram is the mergeable alternative for tools that combine
+    results from several processes (loadgen.py): HDR-style log-linear
+    buckets, i.e. 128 linear sub-buckets per power of two, so any recorded
+    value is reported within 1%.
+'''
+
+
+def send_time_buffer(count):
+    """Preallocated per-packet timestamp array (8 bytes per packet, no per-packet objects)."""
+    return array('d', bytes(8 * count))
+
+
+def packet_count(file_size, data_size):
+    return math.ceil(file_size / data_size)
+
+
+class P2Quantile:
+    """Streaming estimate of the p-quantile (0 < p < 1) in O(1) memory."""
+    def __init__(self, p):
+        self.p = p
+        # With only five markers, P^2 starts out near the median and needs about
+        # 1/(1-p) samples to reach a tail quantile. Until then keep the samples
+        # and answer exactly.
+        self._exact = max(100, math.ceil(1 / min(p, 1 - p)))
+        self._initial = []      # Observations until the markers are seeded
+        self._heights = None
+        self._positions = None
+        self._desired = None
+        self._increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def _seed(self):
+        # Place the markers at the matching order statistics of the buffered
+        # samples, kept strictly increasing so the parabolic update stays defined.
+        ordered = sorted(self._initial)
+        last = len(ordered) - 1
+        self._desired = [last * f for f in self._increments]
+        n = [round(d) for d in self._desired]
+        for i in (1, 2, 3):
+            n[i] = max(n[i], n[i - 1] + 1)
+        for i in (3, 2, 1):
+            n[i] = min(n[i], n[i + 1] - 1)
+        self._positions = n
+        self._heights = [ordered[i] for i in n]
+        self._initial = None
+
+    def add(self, x):
+        q = self._heights
+        if q is None:
+            self._initial.append(x)
+            if len(self._initial) == self._exact:
+                self._seed()
+            return
+
+        n = self._positions
+        # Find the cell containing x, extending the extremes if needed.
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= q[k + 1]:
+                k += 1
+        for i in range(k + 1, 5):
+            n[i] += 1
+        desired = self._desired
+        for i in range(5):
+            desired[i] += self._increments[i]
+
+        # Nudge the three middle markers towards their desired positions.
+        for i in (1, 2, 3):
+            d = desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                parabolic = q[i] + d / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                    + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+                if q[i - 1] < parabolic < q[i + 1]:
+                    q[i] = parabolic
+                else:
+                    q[i] += d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                n[i] += d
+
+    def value(self):
+        if self._heights is not None:
+            return self._heights[2]
+        if not self._initial:
+            return float('nan')
+        ordered = sorted(self._initial)
+        return ordered[round(self.p * (len(ordered) - 1))]
+
+
+class DelayStats:
+    """Running mean plus streaming quantiles of per-packet delay."""
+    def __init__(self, quantiles=(0.5, 0.99)):
+        self.count = 0
+        self.total = 0.0
+        self._sketches = {q: P2Quantile(q) for q in quantiles}
+
+    def add(self, delay):
+        self.count += 1
+        self.total += delay
+        for sketch in self._sketches.values():
+            sketch.add(delay)
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def quantile(self, q):
+        return self._sketches[q].value() if self.count else 0.0
+
+
+class LatencyHistogram:
+    """Log-linear histogram of non-negative integer values (e.g. microseconds) up to max_value."""
+    SUB_BITS = 7
+    SUB = 1 << SUB_BITS
+
+    def __init__(self, max_value=3_600_000_000):
+        self.max_value = max_value
+        self.counts = array('q', bytes(8 * (self._index(max_value) + 1)))
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def _index(self, value):
+        if value < 2 * self.SUB:
+            return value
+        shift = value.bit_length() - (self.SUB_BITS + 1)
+        return self.SUB * (shift + 1) + (value >> shift) - self.SUB
+
+    def _highest_equivalent(self, index):
+        if index < 2 * self.SUB:
+            return index
+        shift = index // self.SUB - 1
+        return ((index % self.SUB + self.SUB) << shift) + (1 << shift) - 1
+
+    def record(self, value):
+        value = min(max(int(value), 0), self.max_value)
+        self.counts[self._index(value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def merge(self, other):
+        for i, n in enumerate(other.counts):
+            if n:
+                self.counts[i] += n
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def quantile(self, q):
+        """Smallest bucket value with at least a q fraction (0 < q <= 1) of the values at or below it."""
+        if not self.count:
+            return 0
+        target = max(1, math.ceil(q * self.count))
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= target:
+                return min(self._highest_equivalent(i), self.max)
+        return self.max
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+import argparse
+import collections
+import contextlib
+import functools
+import heapq
+import io
+import random
+import socket
+from dataclasses import dataclass, field
+
+from pkttrace import TraceRecorder
+from receiver import Receiver
+'''
+    Deterministic in-process network emulator
+
+    The three senders are normally run against receiver.py over real UDP, which
+    makes every number depend on whatever else the host and network are doing.
+    This module replaces the wire with a seeded discrete-event simulation:
+
+        sender --EmulatedSocket--> Link(forward) --> Receiver.handle_packet
+               <-------------------Link(reverse) <--
+
+    Time is virtual. A sender blocked in recvfrom() advances the clock straight to
+    the next scheduled event (or to its timeout), so a transfer that would take
+    minutes on a slow lossy link finishes in well under a second, and the same
+    seed always produces the same packet-level history.
+
+    Each Link models, in this order:
+        1, Drop-tail queue of `queue_size` packets in front of the bottleneck
+        2, Serialization at `bandwidth` bytes/s (None = unlimited)
+        3, Random loss (`loss`) and Gilbert-Elliott burst loss
+           (`burst_enter` / `burst_exit` / `burst_loss`)
+        4, Propagation `delay`, plus `reorder_delay` for a `reorder` fraction of packets
+        5, Duplication of a `duplicate` fraction of packets
+'''
+
+SENDER_ADDR = ("10.0.0.1", 5002)
+RECEIVER_ADDR = ("10.0.0.2", 5001)
+
+
+@dataclass
+class LinkConfig:
+    bandwidth: float = None     # Bottleneck rate in bytes/s, None for unlimited
+    delay: float = 0.01         # One-way propagation delay in seconds
+    queue_size: int = 100       # Packets that may wait for the bottleneck before tail drop
+    loss: float = 0.0           # Independent per-packet loss probability
+    burst_enter: float = 0.0    # P(good -> bad) per packet (Gilbert-Elliott)
+    burst_exit: float = 1.0     # P(bad -> good) per packet
+    burst_loss: float = 1.0     # Loss probability while in the bad state
+    reorder: float = 0.0        # Fraction of packets held back by reorder_delay
+    reorder_delay: float = 0.0  # Extra delay applied to reordered packets
+    duplicate: float = 0.0      # Fraction of packets delivered twice
+
+
+@dataclass
+class LinkStats:
+    sent: int = 0
+    delivered: int = 0
+    queue_drops: int = 0
+    lost: int = 0
+    reordered: int = 0
+    duplicated: int = 0
+
+
+class Link:
+    """One direction of the emulated path."""
+    def __init__(self, network, config, rng):
+        self.network = network
+        self.config = config
+        self.rng = rng
+        self.stats = LinkStats()
+        self._busy_until = 0.0
+        self._departures = collections.deque()  # Departure times of packets still queued
+        self._bad_state = False
+
+    def _is_lost(self):
+        config = self.config
+        if config.burst_enter > 0:
+            if self._bad_state:
+                if self.rng.random() < config.burst_exit:
+                    self._bad_state = False
+            elif self.rng.random() < config.burst_enter:
+                self._bad_state = True
+            if self._bad_state and self.rng.random() < config.burst_loss:
+                return True
+        return config.loss > 0 and self.rng.random() < config.loss
+
+    def transmit(self, data, src, dst):
+        config = self.config
+        now = self.network.now
+        self.stats.sent += 1
+
+        # Packets whose serialization finished have left the queue.
+        while self._departures and self._departures[0] <= now:
+            self._departures.popleft()
+        if len(self._departures) >= config.queue_size:
+            self.stats.queue_drops += 1
+            return
+
+        start = max(now, self._busy_until)
+        depart = start + (len(data) / config.bandwidth if config.bandwidth else 0.0)
+        self._busy_until = depart
+        self._departures.append(depart)
+
+        # A lost packet still occupied the bottleneck; it just never arrives.
+        if self._is_lost():
+            self.stats.lost += 1
+            return
+
+        arrival = depart + config.delay
+        if config.reorder > 0 and self.rng.random() < config.reorder:
+            arrival += config.reorder_delay
+            self.stats.reordered += 1
+        self.network.schedule(arrival, self.network.deliver, data, src, dst)
+        if config.duplicate > 0 and self.rng.random() < config.duplicate:
+            self.stats.duplicated += 1
+            self.network.schedule(arrival, self.network.deliver, data, src, dst)
+
+
+class EmulatedNetwork:
+    def __init__(self, seed=0):
+        self.seed = seed
+        self.now = 0.0
+        self._events = []
+        self._event_seq = 0     # Tie-breaker so equal-time events run in scheduling order
+        self._links = {}
+        self._sockets = {}
+
+    def clock(self):
+        """Virtual time; pass this to a sender as its `clock`."""
+        return self.now
+
+    def connect(self, src, dst, config):
+        """Create the one-way link src -> dst. Each link draws from its own seeded RNG."""
+        rng = random.Random(f"{self.seed}:{src}->{dst}")
+        link = Link(self, config, rng)
+        self._links[(src, dst)] = link
+        return link
+
+    def socket(self, addr, handler=None):
+        sock = EmulatedSocket(self, addr, handler)
+        self._sockets[addr] = sock
+        return sock
+
+    def schedule(self, at, callback, *args):
+        heapq.heappush(self._events, (at, self._event_seq, callback, args))
+        self._event_seq += 1
+
+    def next_event_time(self):
+        return self._events[0][0] if self._events else None
+
+    def run_next(self):
+        at, _, callback, args = heapq.heappop(self._events)
+        self.now = max(self.now, at)
+        callback(*args)
+
+    def send(self, data, src, dst):
+        link = self._links.get((src, dst))
+        if link is None:
+            raise OSError(f"no route from {src} to {dst}")
+        link.transmit(data, src, dst)
+
+    def deliver(self, data, src, dst):
+        sock = self._sockets.get(dst)
+        if sock is not None and not sock.closed:
+            self._links[(src, dst)].stats.delivered += 1
+            sock._deliver(data, src)
+
+
+class EmulatedSocket:
+    """
+    The subset of the UDP socket API the senders and receiver use.
+    A socket created with a `handler` is push-driven: every arriving datagram is
+    passed to handler(data, src, sock) at its virtual arrival time.
+    """
+    def __init__(self, network, addr, handler=None):
+        self.network = network
+        self.addr = addr
+        self.handler = handler
+        self.timeout = None
+        self.closed = False
+        self._inbox = collections.deque()
+
+    def settimeout(self, timeout):
+        self.timeout = timeout
+
+    def gettimeout(self):
+        return self.timeout
+
+    def setsockopt(self, *args):
+        pass
+
+    def bind(self, addr):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def sendto(self, data, addr):
+        # Copy: callers may reuse their packet buffer as soon as sendto returns.
+        self.network.send(bytes(data), self.addr, addr)
+        return len(data)
+
+    def recvfrom(self, bufsize):
+        network = self.network
+        deadline = network.now + self.timeout if self.timeout is not None else None
+        while not self._inbox:
+            next_time = network.next_event_time()
+            if next_time is None or (deadline is not None and next_time > deadline):
+                if deadline is None:
+                    raise RuntimeError("recvfrom would block forever: no events left in the emulated network")
+                if self.timeout == 0:
+                    raise BlockingIOError("no datagram queued")
+                network.now = max(network.now, deadline)
+                raise socket.timeout("timed out")
+            network.run_next()
+        data, src = self._inbox.popleft()
+        return data[:bufsize], src
+
+    def _deliver(self, data, src):
+        if self.handler is not None:
+            self.handler(data, src, self)
+        else:
+            self._inbox.append((data, src))
+
+
+@dataclass
+class TransferResult:
+    throughput: float
+    avg_delay: float
+    performance_metric: float
+    p50_delay: float
+    p99_delay: float
+    elapsed: float              # Virtual seconds from sender creation to completion
+    intact: bool                # Receiver reassembled exactly the sent file
+    forward: LinkStats = field(default_factory=LinkStats)
+    reverse: LinkStats = field(default_factory=LinkStats)
+
+
+def emulate_transfer(sender_cls, filename, forward=None, reverse=None, seed=0, timeout=0.5, quiet=True, tracer=None):
+    """
+    Run one complete file transfer of `sender_cls` against Receiver over an
+    emulated path. `reverse` (the ACK path) defaults to the same config as `forward`.
+    A pkttrace.TraceRecorder passed as `tracer` records both ends on virtual time.
+    """
+    forward = forward if forward is not None else LinkConfig()
+    reverse = reverse if reverse is not None else forward
+    network = EmulatedNetwork(seed)
+    forward_link = network.connect(SENDER_ADDR, RECEIVER_ADDR, forward)
+    reverse_link = network.connect(RECEIVER_ADDR, SENDER_ADDR, reverse)
+
+    receiver = Receiver(tracer, clock=network.clock)
+    network.socket(RECEIVER_ADDR, handler=receiver.handle_packet)
+    sock = network.socket(SENDER_ADDR)
+    sender = sender_cls(RECEIVER_ADDR[0], RECEIVER_ADDR[1], timeout=timeout, sock=sock, clock=network.clock,
+                        tracer=tracer)
+
+    # The senders print their CSV line; keep it out of the way when running many transfers.
+    with contextlib.redirect_stdout(io.StringIO()) if quiet else contextlib.nullcontext():
+        throughput, avg_delay, performance_metric = sender.send_file(filename)
+
+    with open(filename, 'rb') as f:
+        intact = receiver.data() == f.read()
+    return TransferResult(throughput, avg_delay, performance_metric,
+                          sender.delay_stats.quantile(0.5), sender.delay_stats.quantile(0.99),
+                          network.now, intact, forward_link.stats, reverse_link.stats)
+
+
+def main():
+    from sender import SENDERS
+
+    parser = argparse.ArgumentParser(description="Run one sender over the deterministic network emulator.")
+    parser.add_argument("protocol", choices=sorted(SENDERS), type=str.lower)
+    parser.add_argument("filename")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--bandwidth", type=float, default=None, help="bytes/s (default: unlimited)")
+    parser.add_argument("--delay", type=float, default=0.01, help="one-way propagation delay in seconds")
+    parser.add_argument("--queue-size", type=int, default=100)
+    parser.add_argument("--loss", type=float, default=0.0)
+    parser.add_argument("--burst-enter", type=float, default=0.0)
+    parser.add_argument("--burst-exit", type=float, default=1.0)
+    parser.add_argument("--burst-loss", type=float, default=1.0)
+    parser.add_argument("--reorder", type=float, default=0.0)
+    parser.add_argument("--reorder-delay", type=float, default=0.0)
+    parser.add_argument("--duplicate", type=float, default=0.0)
+    parser.add_argument("--trace", help="write a pkttrace file of both ends")
+    parser.add_argument("--compress", choices=["zlib", "lzma"], help="negotiate block compression")
+    args = parser.parse_args()
+
+    config = LinkConfig(args.bandwidth, args.delay, args.queue_size, args.loss, args.burst_enter,
+                        args.burst_exit, args.burst_loss, args.reorder, args.reorder_delay, args.duplicate)
+    tracer = TraceRecorder(args.trace) if args.trace else None
+    sender_cls = SENDERS[args.protocol]
+    if args.compress:
+        sender_cls = functools.partial(sender_cls, compress=args.compress)
+    result = emulate_transfer(sender_cls, args.filename, config, seed=args.seed, tracer=tracer)
+    if tracer is not None:
+        tracer.close()
+    # Same three-value line the senders print on a live run.
+    print(f"{result.throughput:.7f}, {result.avg_delay:.7f}, {result.performance_metric:.7f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+import random
+import struct
+from collections import namedtuple
+'''
+    Versioned packet header shared by the senders and receiver.py
+
+    The original format put the byte offset in a 4-byte signed field, so any
+    file over 2 GiB overflowed partway through the transfer. Version 1 header
+    (network byte order, 18 bytes):
+
+        magic    2s   b'\xa5\x5a'
+        version  B    1
+        flags    B    FLAG_ACK / FLAG_FIN / FLAG_FEC / FLAG_SYN
+        offset   Q    byte offset (64-bit): sequence number on data, cumulative ACK on acks
+        session  I    random per transfer, echoed in every ACK
+        length   H    payload length
+
+    Legacy packets are still recognized: their first four bytes are a
+    non-negative signed offset, so the first byte is always < 0x80, while the
+    magic starts with 0xa5.
+
+    Message types:
+        data      flags 0, payload = file bytes (empty payload = EOF)
+        ack       FLAG_ACK, offset = next expected byte
+        fin       FLAG_FIN, from the receiver once the EOF packet is in order
+        finack    FLAG_FIN | FLAG_ACK, from the sender, tells the receiver to exit
+        repair    FLAG_FEC, XOR parity of a block of data packets (see fec.py)
+        syn       FLAG_SYN, optional, payload = requested codec (see compress.py)
+        synack    FLAG_SYN | FLAG_ACK, payload = codec the receiver will decode, or "none"
+'''
+
+MAGIC = b'\xa5\x5a'
+VERSION = 1
+FLAG_ACK = 0x01
+FLAG_FIN = 0x02
+FLAG_FEC = 0x04
+FLAG_SYN = 0x08
+
+HEADER = struct.Struct('!2sBBQIH')
+HEADER_SIZE = HEADER.size
+PACKET_SIZE = 1024
+DATA_SIZE = PACKET_SIZE - HEADER_SIZE
+
+LEGACY_SEQ_ID_SIZE = 4
+LEGACY_SEQ = struct.Struct('!i')
+LEGACY_FINACK = b'==FINACK=='
+
+Packet = namedtuple('Packet', 'flags offset session payload legacy')
+
+
+class PacketFormatError(Exception):
+    pass
+
+
+def new_session_id():
+    return random.getrandbits(32)
+
+
+def is_legacy(packet):
+    return packet[:2] != MAGIC
+
+
+def parse(packet):
+    """Decode a packet in either format. `payload` is a slice of `packet`."""
+    if not is_legacy(packet):
+        if len(packet) < HEADER_SIZE:
+            raise PacketFormatError(f"truncated header ({len(packet)} bytes)")
+        _, version, flags, offset, session, length = HEADER.unpack_from(packet)
+        if version != VERSION:
+            raise PacketFormatError(f"unsupported packet version {version}")
+        if len(packet) != HEADER_SIZE + length:
+            # PacketWriter sends exactly header + payload; anything else is truncated or corrupt
+            raise PacketFormatError(f"header says {length} payload bytes, datagram carries {len(packet) - HEADER_SIZE}")
+        return Packet(flags, offset, session, packet[HEADER_SIZE:], False)
+
+    if len(packet) < LEGACY_SEQ_ID_SIZE:
+        raise PacketFormatError(f"truncated legacy header ({len(packet)} bytes)")
+    offset = LEGACY_SEQ.unpack_from(packet)[0]
+    payload = packet[LEGACY_SEQ_ID_SIZE:]
+    flags = FLAG_FIN | FLAG_ACK if payload == LEGACY_FINACK else 0
+    return Packet(flags, offset, 0, payload, True)
+
+
+class PacketWriter:
+    """
+    Builds packets into one preallocated buffer with pack_into. The returned
+    memoryview is only valid until the next call; hand it straight to sendto().
+    With legacy=True it writes the old 4-byte-offset format instead.
+    """
+    def __init__(self, session_id=None, legacy=False, capacity=PACKET_SIZE):
+        self.session_id = new_session_id() if session_id is None else session_id
+        self.legacy = legacy
+        self._buf = bytearray(capacity)
+        self._view = memoryview(self._buf)
+
+    def pack(self, offset, data=b"", flags=0):
+        n = len(data)
+        if self.legacy:
+            if not 0 <= offset < 2 ** 31:
+                raise PacketFormatError(f"offset {offset} does not fit the legacy 4-byte header")
+            if flags == FLAG_FIN | FLAG_ACK:
+                data, n = LEGACY_FINACK, len(LEGACY_FINACK)
+            elif flags:
+                # The old format has no flags field; anything else would go out as file data
+                raise PacketFormatError(f"flags {flags:#x} cannot be sent in the legacy 4-byte format")
+            LEGACY_SEQ.pack_into(self._buf, 0, offset)
+            header = LEGACY_SEQ_ID_SIZE
+        else:
+            HEADER.pack_into(self._buf, 0, MAGIC, VERSION, flags, offset, self.session_id, n)
+            header = HEADER_SIZE
+        self._buf[header:header + n] = data
+        return self._view[:header + n]
+
+
+def recv_ack_packet(sock, session_id, legacy=False):
+    """
+    Wait for the next ACK of this transfer and return it as a Packet. ACKs from
+    other sessions (e.g. a previous run on the same port) are skipped. A legacy
+    reply to a versioned sender means the peer predates this header.
+    """
+    while True:
+        data, _ = sock.recvfrom(PACKET_SIZE)
+        try:
+            ack = parse(data)
+        except PacketFormatError:
+            continue    # Runt or foreign datagram: keep waiting for a real ACK
+        if ack.legacy and not legacy:
+            raise PacketFormatError("receiver answered in the legacy 4-byte format; rerun the sender with legacy=True")
+        if legacy or ack.session == session_id:
+            return ack
+
+
+def recv_ack(sock, session_id, legacy=False):
+    """Like recv_ack_packet(), returning only the cumulative ACK offset."""
+    return recv_ack_packet(sock, session_id, legacy).offset
@@ -0,0 +1,88 @@
+import struct
+'''
+    Per-packet trace recording
+
+    Opt-in hook for the senders and receiver. Every event is packed into a
+    fixed-width little-endian record in a preallocated buffer and the buffer is
+    written out whenever it fills, so tracing does not allocate per packet.
+
+    File layout:
+        FILE_HEADER  magic b'PTRC', format version (uint16), record size (uint16)
+        RECORD * n   time (f8), event (u1), offset (i8), length (u4), value (f8)
+
+    analysis.load_trace() reads the records back as a numpy structured array.
+
+    Field meaning per event:
+        SEND / RETRANSMIT   offset, length = data packet sent
+        ACK                 offset = cumulative ACK received
+        DUP_ACK             offset = repeated ACK, value = duplicate count
+        TIMEOUT             offset = first unacknowledged byte
+        CWND                value = new cwnd (packets), offset = ssthresh
+        ACKED               offset, length = packet newly acknowledged, value = its delay
+        RECV                (receiver) offset, length = data packet received
+        ACK_SENT            (receiver) offset = cumulative ACK sent
+        REPAIR              offset = first byte of the FEC block, length = packets it covers
+        RECOVERED           (receiver) offset, length = data packet rebuilt from a repair
+'''
+
+SEND = 1
+RETRANSMIT = 2
+ACK = 3
+DUP_ACK = 4
+TIMEOUT = 5
+CWND = 6
+ACKED = 7
+RECV = 8
+ACK_SENT = 9
+REPAIR = 10
+RECOVERED = 11
+
+EVENT_NAMES = {SEND: "send", RETRANSMIT: "retransmit", ACK: "ack", DUP_ACK: "dup_ack", TIMEOUT: "timeout",
+               CWND: "cwnd", ACKED: "acked", RECV: "recv", ACK_SENT: "ack_sent",
+               REPAIR: "repair", RECOVERED: "recovered"}
+
+FORMAT_VERSION = 1
+RECORD = struct.Struct('<dBqId')
+FILE_HEADER = struct.Struct('<4sHH')
+MAGIC = b'PTRC'
+
+
+class TraceRecorder:
+    def __init__(self, path, capacity=65536):
+        self.capacity = capacity
+        self._buf = bytearray(RECORD.size * capacity)
+        self._count = 0
+        self._file = open(path, 'wb')
+        self._file.write(FILE_HEADER.pack(MAGIC, FORMAT_VERSION, RECORD.size))
+
+    def record(self, event, t, offset=0, length=0, value=0.0):
+        RECORD.pack_into(self._buf, self._count * RECORD.size, t, event, offset, length, value)
+        self._count += 1
+        if self._count == self.capacity:
+            self.flush()
+
+    def flush(self):
+        if self._count:
+            self._file.write(memoryview(self._buf)[:self._count * RECORD.size])
+            self._count = 0
+        self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def iter_records(path):
+    """Pure-Python reader, for when numpy is not available."""
+    with open(path, 'rb') as f:
+        magic, version, size = FILE_HEADER.unpack(f.read(FILE_HEADER.size))
+        if magic != MAGIC or size != RECORD.size:
+            raise ValueError(f"{path} is not a version {FORMAT_VERSION} packet trace")
+        yield from RECORD.iter_unpack(f.read())
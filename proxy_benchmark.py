@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import socket
+import struct
+import threading
+import time
+
+import proxy_server
+'''
+    Loopback throughput of the proxy's relay mode
+
+    Starts a sink server and the proxy on ephemeral loopback ports, then pushes
+    --size bytes through a relay connection (and, for comparison, straight to
+    the sink). The client half-closes when done. The sink counts the bytes it
+    got until EOF and sends the count back, so every run also checks that the
+    proxy passes the half-close through and carries the response back.
+
+    Usage:
+        python proxy_benchmark.py --size 4G --repeat 3
+        python proxy_benchmark.py --echo        # full duplex: the sink echoes everything back
+'''
+
+COUNT = struct.Struct('!Q')
+CHUNK = 1024 * 1024
+
+
+def parse_size(text):
+    units = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+    if text[-1].upper() in units:
+        return int(float(text[:-1]) * units[text[-1].upper()])
+    return int(text)
+
+
+def sink(conn, echo):
+    with conn:
+        buffer = bytearray(CHUNK)
+        view = memoryview(buffer)
+        total = 0
+        while True:
+            n = conn.recv_into(buffer)
+            if n == 0:
+                break
+            total += n
+            if echo:
+                conn.sendall(view[:n])
+        conn.sendall(COUNT.pack(total))
+
+
+def listen(target, *args):
+    listener = socket.create_server(("127.0.0.1", 0))
+    threading.Thread(target=target, args=(listener,) + args, daemon=True).start()
+    return listener.getsockname()
+
+
+def serve_sink(listener, echo):
+    while True:
+        conn, _ = listener.accept()
+        threading.Thread(target=sink, args=(conn, echo), daemon=True).start()
+
+
+def drain(sock, size, result):
+    # Read everything the far side sends back; the last COUNT.size bytes are the byte count
+    buffer = bytearray(CHUNK)
+    tail = b""
+    received = 0
+    while True:
+        n = sock.recv_into(buffer)
+        if n == 0:
+            break
+        received += n
+        tail = bytes(buffer[n - COUNT.size:n]) if n >= COUNT.size else (tail + bytes(buffer[:n]))[-COUNT.size:]
+    result["received"] = received
+    result["count"] = COUNT.unpack(tail)[0] if len(tail) == COUNT.size else -1
+
+
+def transfer(addr, size, header=None, echo=False):
+    """Send `size` bytes, half-close, and wait for the reply. Returns (seconds, sink byte count)."""
+    payload = memoryview(bytearray(CHUNK))
+    result = {}
+    with socket.create_connection(addr) as sock:
+        start = time.perf_counter()
+        if header is not None:
+            sock.sendall(json.dumps(header).encode())
+        reader = threading.Thread(target=drain, args=(sock, size, result))
+        reader.start()
+        remaining = size
+        while remaining > 0:
+            sock.sendall(payload[:min(CHUNK, remaining)])
+            remaining -= min(CHUNK, remaining)
+        sock.shutdown(socket.SHUT_WR)
+        reader.join()
+        elapsed = time.perf_counter() - start
+    expected = size + COUNT.size if echo else COUNT.size
+    if result["count"] != size or result["received"] != expected:
+        raise RuntimeError(f"sink got {result['count']} of {size} bytes, client got back {result['received']}")
+    return elapsed, result["count"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure relay-mode throughput through proxy_server on loopback.")
+    parser.add_argument("--size", default="1G", help="bytes per transfer, e.g. 512M or 4G")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--echo", action="store_true", help="sink echoes the data back (full duplex)")
+    args = parser.parse_args()
+    size = parse_size(args.size)
+
+    sink_addr = listen(serve_sink, args.echo)
+    proxy_addr = listen(proxy_server.serve)
+    header = {"server_ip": sink_addr[0], "server_port": sink_addr[1], "mode": "relay"}
+    print(f"relay copy path: {'os.splice' if proxy_server._can_splice else 'recv_into'}")
+
+    for name, addr, hdr in (("direct", sink_addr, None), ("proxy", proxy_addr, header)):
+        rates = []
+        for _ in range(args.repeat):
+            elapsed, _ = transfer(addr, size, hdr, args.echo)
+            rates.append(size / elapsed / 1e9)
+        print(f"{name:>6}: best {max(rates):.2f} GB/s, mean {sum(rates) / len(rates):.2f} GB/s "
+              f"({args.repeat} x {size} bytes{', echoed' if args.echo else ''})")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,33 +6,158 @@
     # Learning  Socket and Json
     # Link: https://docs.python.org/3/howto/sockets.html.
     # Link: https://docs.python.org/3/library/json.html
+import argparse
+import contextlib
+import os
 import socket
 import json
+import threading
+
+from address import Address, connect, listen, parse_address
+from upstream import load_pools
 
 PROXY_HOST = '127.0.0.1'
 PROXY_PORT = 8000
 BLOCKED_IPS = ['10.10.10.10']  
 _max_buffersize = 1024
 
+# Relay mode: {"server_ip": ..., "server_port": ..., "mode": "relay"} followed by any
+# amount of raw bytes. After the JSON header the proxy just pumps bytes both ways
+# until each side closes, so requests and responses of any size get through.
+_relay_buffersize = 256 * 1024   # One preallocated buffer per direction
+_max_headersize = 64 * 1024
+_header_timeout = 5.0
+_decoder = json.JSONDecoder()
+_can_splice = hasattr(os, 'splice')  # Linux, Python 3.10+: move bytes socket -> pipe -> socket in the kernel
+
+# Named upstream pools (see upstream.py): {"pool": "name"} replaces server_ip/server_port
+UPSTREAM_POOLS = {}
+
+
+def read_header(conn):
+    """
+    Read until one complete JSON object has arrived. Returns (header dict, bytes
+    received after it). raw_decode tells us where the JSON ends, so whatever the
+    client sent right behind the header is kept for the upstream.
+    """
+    buffered = bytearray()
+    conn.settimeout(_header_timeout)
+    try:
+        while len(buffered) < _max_headersize:
+            chunk = conn.recv(_max_buffersize)
+            if not chunk:
+                break
+            buffered += chunk
+            # surrogateescape keeps one character per undecodable byte, so the
+            # character index maps back to a byte index below
+            text = buffered.decode('utf-8', 'surrogateescape')
+            try:
+                header, end = _decoder.raw_decode(text.lstrip())
+            except json.JSONDecodeError:
+                continue    # Incomplete (or invalid, which the timeout will catch)
+            end += len(text) - len(text.lstrip())
+            return header, bytes(buffered[len(text[:end].encode('utf-8', 'surrogateescape')):])
+    except socket.timeout:
+        pass
+    finally:
+        conn.settimeout(None)
+    raise json.JSONDecodeError("no complete JSON header", buffered.decode('utf-8', 'replace'), len(buffered))
+
+
+def _shutdown_write(sock):
+    try:
+        sock.shutdown(socket.SHUT_WR)
+    except OSError:
+        pass    # Peer already gone
+
+
+def _pump_splice(src, dst):
+    # Zero-copy path: the bytes never enter Python
+    read_end, write_end = os.pipe()
+    try:
+        while True:
+            n = os.splice(src.fileno(), write_end, _relay_buffersize)
+            if n == 0:
+                return
+            while n:
+                n -= os.splice(read_end, dst.fileno(), n)
+    finally:
+        os.close(read_end)
+        os.close(write_end)
+
+
+def _pump_copy(src, dst):
+    buffer = bytearray(_relay_buffersize)
+    view = memoryview(buffer)
+    while True:
+        n = src.recv_into(buffer)
+        if n == 0:
+            return
+        dst.sendall(view[:n])
+
+
+def pump(src, dst):
+    """Copy src -> dst until src reaches EOF, then half-close dst so the peer sees EOF too."""
+    try:
+        if _can_splice:
+            _pump_splice(src, dst)
+        else:
+            _pump_copy(src, dst)
+    except OSError:
+        # Reset on either side: stop reading from the other direction as well
+        try:
+            src.shutdown(socket.SHUT_RD)
+        except OSError:
+            pass
+    finally:
+        _shutdown_write(dst)
+
+
+def relay(conn, server_socket, pending=b""):
+    """Full duplex: client -> upstream on a helper thread, upstream -> client on this one."""
+    if pending:
+        server_socket.sendall(pending)
+    upstream = threading.Thread(target=pump, args=(conn, server_socket), daemon=True)
+    upstream.start()
+    pump(server_socket, conn)
+    upstream.join()
+
+
+def open_upstream(pool, server):
+    """(pool member or None, connected socket) for a pool or an explicit address."""
+    if pool is not None:
+        return pool.connect()
+    return None, connect(server)
+
+
+def destination_of(client_data):
+    # "server": "host:port" / "unix:/path" also reaches backends on Unix sockets
+    if 'server' in client_data:
+        return parse_address(client_data['server'])
+    return Address(socket.AF_INET6 if ':' in client_data['server_ip'] else socket.AF_INET,
+                   (client_data['server_ip'], client_data['server_port']))
+
+
 # Handling about the client parts
 def handle_client(conn, addr):
     print(f"Handling connection from {addr}")
     # https://stackoverflow.com/questions/64237717/conn-sendhi-encode-brokenpipeerror-errno-32-broken-pipe-socket
-    data = conn.recv(_max_buffersize).decode()
-    print(f"Received JSON data: {data}")
-    
     try:
-        client_data = json.loads(data)
-        server_ip = client_data['server_ip']
-        server_port = client_data['server_port']
-        message = client_data['message']
-    except (json.JSONDecodeError, KeyError) as e:
+        client_data, pending = read_header(conn)
+        print(f"Received JSON data: {client_data}")
+        pool = UPSTREAM_POOLS[client_data['pool']] if 'pool' in client_data else None
+        server = destination_of(client_data) if pool is None else None
+        relay_mode = client_data.get('mode') == 'relay'
+        message = client_data.get('message', '') if relay_mode else client_data['message']
+    except (json.JSONDecodeError, KeyError, AttributeError, TypeError, ValueError) as e:
         error_msg = "Error: Invalid JSON format"
         conn.send(error_msg.encode())
         conn.close()
         return
     
-    print(f"Forwarding message '{message}' to {server_ip}:{server_port}")
+    destination = f"pool {pool.name}" if pool is not None else server
+    print(f"Forwarding {'relay' if relay_mode else repr(message)} to {destination}")
+    server_ip = server.target[0] if server is not None and server.family != socket.AF_UNIX else None
     
     
     # Handling about the IP filtering (Third Requirement)
@@ -42,32 +167,76 @@ def handle_client(conn, addr):
         conn.close()
         return
     
+    if relay_mode:
+        try:
+            backend, server_socket = open_upstream(pool, server)
+        except OSError as errorHanlding:
+            print(f"Error: {errorHanlding}")
+            conn.send(f"Error: {errorHanlding}".encode())
+            conn.close()
+            return
+        server_socket.settimeout(None)  # Relays may idle; pool health is judged on connect only
+        try:
+            with conn, server_socket:
+                relay(conn, server_socket, message.encode() + pending)
+        finally:
+            if backend is not None:
+                pool.release(backend, ok=True)
+        return
+
     # My proxy will handling the server's IP from the client's data 
     # Also handling about the proxy sending the correct data to the Serives
     # Handling the recived response from the serves 
     # Reference useed: 
     # https://stackoverflow.com/questions/55661626/with-socket-socketsocket-af-inet-socket-sock-stream-as-s-get-error-attribut
+    backend = None
     try:
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as server_socket:
-            server_socket.connect((server_ip, server_port))
+        backend, server_socket = open_upstream(pool, server)
+        with server_socket:
             server_socket.sendall(message.encode()) # encoding my message and sending to the Server
             response = server_socket.recv(_max_buffersize).decode() # Decoding my response msg from Server
             print(f"Received server response: {response}")
+        if not response:
+            raise ConnectionError("backend closed the connection without a response")
+        if backend is not None:
+            pool.release(backend, ok=True)
     except Exception as errorHanlding:
+        if backend is not None:
+            pool.release(backend, ok=False)     # Passive health check: timeouts and errors count
         response = f"Error: {str(errorHanlding)}"  # Error Handling if the response has issues
         print(response)
     # https://stackoverflow.com/questions/64237717/conn-sendhi-encode-brokenpipeerror-errno-32-broken-pipe-socket
     conn.send(response.encode())
     conn.close()
 
-def run_proxy():
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        s.bind((PROXY_HOST, PROXY_PORT))
-        s.listen()
-        print(f"Proxy server running on {PROXY_HOST}:{PROXY_PORT}")
-        while True:
-            conn, addr = s.accept()
-            handle_client(conn, addr)
+def serve(listener):
+    # One thread per connection, so a long relay does not block other clients
+    while True:
+        conn, addr = listener.accept()
+        threading.Thread(target=handle_client, args=(conn, addr), daemon=True).start()
+
+def run_proxy(addresses=(f"{PROXY_HOST}:{PROXY_PORT}",)):
+    # Any mix of TCP and Unix socket listeners; the upstream side is chosen per request
+    listeners = [listen(address) for address in addresses]
+    try:
+        for address in addresses:
+            print(f"Proxy server running on {address}")
+        for s in listeners[1:]:
+            threading.Thread(target=serve, args=(s,), daemon=True).start()
+        serve(listeners[0])
+    finally:
+        for s, address in zip(listeners, map(parse_address, addresses)):
+            s.close()
+            if address.family == socket.AF_UNIX:
+                with contextlib.suppress(FileNotFoundError):   # Already removed by hand or another instance
+                    os.unlink(address.target)
 
 if __name__ == '__main__':
-    run_proxy()
+    parser = argparse.ArgumentParser(description="JSON-addressed TCP / Unix socket proxy.")
+    parser.add_argument("--listen", action="append", help="host:port or unix:/path, repeatable "
+                                                          f"(default {PROXY_HOST}:{PROXY_PORT})")
+    parser.add_argument("--config", help="JSON file with upstream pools (see upstream.py)")
+    args = parser.parse_args()
+    if args.config:
+        UPSTREAM_POOLS.update(load_pools(args.config))
+    run_proxy(args.listen or [f"{PROXY_HOST}:{PROXY_PORT}"])
@@ -1,65 +1,158 @@
 import random
 import socket
+import sys
+import time
 
-PACKET_SIZE = 1024
-SEQ_ID_SIZE = 4
-MESSAGE_SIZE = PACKET_SIZE - SEQ_ID_SIZE
-EXPECTED_SEQ_ID = 0
-RECEIVED_DATA = {}
+from batchrecv import BatchReceiver
+from compress import choose_codec, decode_frames
+from fec import MAX_DATAGRAM, RECOVERED as RECOVERED_COUNT, FecDecoder
+from packet import (DATA_SIZE, FLAG_ACK, FLAG_FEC, FLAG_FIN, FLAG_SYN, LEGACY_SEQ_ID_SIZE, PacketFormatError,
+                    PacketWriter, parse)
+from pkttrace import RECV, ACK_SENT, RECOVERED, TraceRecorder
+
+SEQ_ID_SIZE = LEGACY_SEQ_ID_SIZE    # Header size of the legacy format
+MESSAGE_SIZE = DATA_SIZE
+OUTPUT_PATH = '/hdd/file2.mp3'
 
 def create_acknowledgement(seq_id, message):
+    """Legacy-format ACK/FIN, used when the sender speaks the old 4-byte header."""
     return int.to_bytes(seq_id, SEQ_ID_SIZE, signed=True, byteorder='big') + message.encode()
 
-# create a udp socket
-with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as udp_socket:
-    # bind the socket to a OS port
-    # bind to 0.0.0.0 so external 
-    udp_socket.bind(("0.0.0.0", 5001))
+class Receiver:
+    """
+    Receiver-side protocol state, independent of where packets come from.
+    handle_packet() is fed one datagram at a time and answers through `sock`,
+    so the same logic runs on a real UDP socket or inside the network emulator.
+    """
+    def __init__(self, tracer=None, clock=time.time):
+        self.expected_seq_id = 0
+        self.received_data = {}
+        self.finished = False
+        self.tracer = tracer    # Optional pkttrace.TraceRecorder
+        self.clock = clock
+        self.writer = PacketWriter(session_id=0)  # Reused ACK buffer; session is copied from each packet
+        self.fec = FecDecoder(self.received_data)  # Rebuilds lost packets from repair packets, if the sender sends any
+        self.fec_seen = False
+        self.codec = None       # Set by the SYN handshake when the sender compresses (see compress.py)
 
-    print("Receiver running")
-    # start receiving packets
-    while True:
-        timeouts = 0
+    def reply(self, offset, flags, request, client, sock):
+        """Send an ACK or FIN in the same header format as `request`."""
+        if request.legacy:
+            if flags & FLAG_FIN:
+                sock.sendto(create_acknowledgement(offset + 3, 'fin'), client)
+            else:
+                sock.sendto(create_acknowledgement(offset, 'ack'), client)
+            return
+        self.writer.session_id = request.session
+        # With FEC active, ACKs report how many packets were rebuilt so the sender can size its blocks
+        payload = RECOVERED_COUNT.pack(self.fec.recovered) if self.fec_seen and flags == FLAG_ACK else b""
+        sock.sendto(self.writer.pack(offset, payload, flags), client)
+
+    def handle_packet(self, packet, client, sock, arrival=None):
+        # `packet` may be a view into a reused receive buffer (see batchrecv.py);
+        # `arrival` is its kernel receive timestamp, when the socket provides one.
+        # decode the header (versioned or legacy) to get the message id
         try:
-            # receive the packet
-            packet, client = udp_socket.recvfrom(PACKET_SIZE)
-            
-            # get the message id
-            seq_id, message = packet[:SEQ_ID_SIZE], packet[SEQ_ID_SIZE:]
-            
-            # check if finack message
-            if message == b'==FINACK==':
-                break
-            
-            # if the message id is -1, we have received all the packets
-            seq_id = int.from_bytes(seq_id, signed=True, byteorder='big')
-            
+            request = parse(packet)
+        except PacketFormatError:
+            return  # Not one of ours, or a newer version: drop it
+        seq_id, message = request.offset, request.payload
+
+        # check if finack message
+        if request.flags == FLAG_FIN | FLAG_ACK:
+            self.finished = True
+            return
+
+        if request.flags & FLAG_SYN:
+            # compression handshake: agree on the codec, no data yet
+            self.codec = choose_codec(message)
+            self.writer.session_id = request.session
+            sock.sendto(self.writer.pack(0, (self.codec or "none").encode(), FLAG_SYN | FLAG_ACK), client)
+            return
+
+        if request.flags & FLAG_FEC:
+            # repair packet: only worth an ACK if it let us rebuild something
+            self.fec_seen = True
+            rebuilt = self.fec.add_repair(seq_id, message)
+            if not rebuilt:
+                return
+        else:
+            if self.tracer is not None:
+                self.tracer.record(RECV, self.clock() if arrival is None else arrival, seq_id, len(message))
+
             # keep track of received sequences
-            RECEIVED_DATA[seq_id] = message
-            
-            # check if sequence id is same as expected and move forward
-            if seq_id <= EXPECTED_SEQ_ID and len(RECEIVED_DATA[seq_id]) > 0:
-                while EXPECTED_SEQ_ID in RECEIVED_DATA:
-                    EXPECTED_SEQ_ID += len(RECEIVED_DATA[seq_id])
-            
-            # create ack id
-            ack_id = EXPECTED_SEQ_ID
-            
-            # create the acknowledgement
-            acknowledgement = create_acknowledgement(ack_id, 'ack')
-
-            # send the acknowledgement
-            udp_socket.sendto(acknowledgement, client)
-            
-            # check if all data received (empty message)
-            if len(message) == 0 and ack_id == seq_id:
-                ack = create_acknowledgement(ack_id, 'ack')
-                fin = create_acknowledgement(ack_id + 3, 'fin')
-                udp_socket.sendto(ack, client)
-                udp_socket.sendto(fin, client)
+            self.received_data[seq_id] = bytes(message)   # Copy: the receive buffer is reused
+            rebuilt = self.fec.on_data(seq_id) if self.fec_seen else []
+
+        if self.tracer is not None:
+            for offset in rebuilt:
+                self.tracer.record(RECOVERED, self.clock(), offset, len(self.received_data[offset]))
+
+        # move forward over everything now contiguous (received or rebuilt)
+        while self.expected_seq_id in self.received_data and len(self.received_data[self.expected_seq_id]) > 0:
+            self.expected_seq_id += len(self.received_data[self.expected_seq_id])
+
+        # create ack id
+        ack_id = self.expected_seq_id
+
+        # create and send the acknowledgement
+        self.reply(ack_id, FLAG_ACK, request, client, sock)
+        if self.tracer is not None:
+            self.tracer.record(ACK_SENT, self.clock(), ack_id)
+
+        # check if all data received (empty message)
+        if len(message) == 0 and ack_id == seq_id:
+            self.reply(ack_id, FLAG_ACK, request, client, sock)
+            self.reply(ack_id, FLAG_FIN, request, client, sock)
+
+    def chunks(self):
+        """Reassembled file contents in offset order, decompressed if the transfer was compressed."""
+        ordered = (self.received_data[sid] for sid in sorted(self.received_data.keys()))
+        return ordered if self.codec is None else decode_frames(ordered)
+
+    def data(self):
+        return b''.join(self.chunks())
+
+    def write(self, path):
+        with open(path, 'wb') as f:
+            for chunk in self.chunks():
+                f.write(chunk)
+
+def run_receiver(udp_socket, receiver=None, batch=64):
+    receiver = receiver if receiver is not None else Receiver()
+    # Batches of datagrams into a ring of reused buffers, with kernel arrival times
+    batcher = BatchReceiver(udp_socket, MAX_DATAGRAM, batch)
+    # start receiving packets
+    while not receiver.finished:
+        try:
+            count = batcher.receive()
         except socket.timeout:
-            timeouts += 1
+            continue
+        for packet, client, arrival in batcher.packets(count):
+            receiver.handle_packet(packet, client, udp_socket, arrival)
+            if receiver.finished:
+                break
+    return receiver
+
+if __name__ == '__main__':
+    # Usage: python receiver.py [output_path] [--trace trace.bin]
+    args = sys.argv[1:]
+    tracer = None
+    if "--trace" in args:
+        i = args.index("--trace")
+        tracer = TraceRecorder(args[i + 1])
+        del args[i:i + 2]
+
+    # create a udp socket
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as udp_socket:
+        # bind the socket to a OS port
+        # bind to 0.0.0.0 so external
+        udp_socket.bind(("0.0.0.0", 5001))
+
+        print("Receiver running")
+        receiver = run_receiver(udp_socket, Receiver(tracer))
 
-with open('/hdd/file2.mp3', 'wb') as f:
-    for sid in sorted(RECEIVED_DATA.keys()):
-        f.write(RECEIVED_DATA[sid])
\ No newline at end of file
+    if tracer is not None:
+        tracer.close()
+    # Optional first argument overrides where the received file is written
+    receiver.write(args[0] if args else OUTPUT_PATH)
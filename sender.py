@@ -1,30 +1,58 @@
 #!/usr/bin/env python3
 import sys
+from functools import partial
+from pkttrace import TraceRecorder
 from stopAndWait import StopAndWaitSenderWithMetrics
 from fixedSlidingWindow import FixedWindowSenderWithMetrics
 from tcpReno import TcpRenoSenderWithMetrics
 
+# Protocol name (lowercased) -> sender class
+SENDERS = {
+    "stopandwait": StopAndWaitSenderWithMetrics,
+    "fixedslidingwindow": FixedWindowSenderWithMetrics,
+    "tcpreno": TcpRenoSenderWithMetrics,
+    "tcprenofec": partial(TcpRenoSenderWithMetrics, fec=True),  # TCP Reno + XOR forward error correction
+}
+
 def main():
-    if len(sys.argv) < 4:
-        print("Usage: python sender.py <protocol> <filename> <dest_ip>")
-        print("  protocol options: stopAndWait, fixedSlidingWindow, tcpReno")
+    args = sys.argv[1:]
+    tracer = None
+    if "--trace" in args:
+        i = args.index("--trace")
+        tracer = TraceRecorder(args[i + 1])
+        del args[i:i + 2]
+    # --legacy: talk to a receiver that only understands the old 4-byte-offset header
+    legacy = "--legacy" in args
+    if legacy:
+        args.remove("--legacy")
+    # --compress zlib|lzma: compress blocks of the file, if the receiver agrees (see compress.py)
+    compress = None
+    if "--compress" in args:
+        i = args.index("--compress")
+        compress = args[i + 1]
+        del args[i:i + 2]
+
+    if len(args) < 3:
+        print("Usage: python sender.py <protocol> <filename> <dest_ip> [--trace trace.bin] [--legacy] [--compress zlib|lzma]")
+        print("  protocol options: stopAndWait, fixedSlidingWindow, tcpReno, tcpRenoFec")
         sys.exit(1)
-    
-    protocol_choice = sys.argv[1].lower()
-    filename = sys.argv[2]
-    dest_ip = sys.argv[3]
-    
-    if protocol_choice == "stopandwait":
-        sender = StopAndWaitSenderWithMetrics(dest_ip, dest_port=5001)
-    elif protocol_choice == "fixedslidingwindow":
-        sender = FixedWindowSenderWithMetrics(dest_ip, dest_port=5001)
-    elif protocol_choice == "tcpreno":
-        sender = TcpRenoSenderWithMetrics(dest_ip, dest_port=5001)
-    else:
-        print("Unknown protocol. Choose 'stopAndWait', 'fixedSlidingWindow', or 'tcpReno'.")
+
+    if legacy and compress:
+        print("--compress needs the versioned header and cannot be combined with --legacy.")
         sys.exit(1)
-    
+
+    protocol_choice = args[0].lower()
+    filename = args[1]
+    dest_ip = args[2]
+
+    if protocol_choice not in SENDERS:
+        print("Unknown protocol. Choose 'stopAndWait', 'fixedSlidingWindow', 'tcpReno', or 'tcpRenoFec'.")
+        sys.exit(1)
+    sender = SENDERS[protocol_choice](dest_ip, dest_port=5001, tracer=tracer, legacy=legacy, compress=compress)
+
     sender.send_file(filename)
+    if tracer is not None:
+        tracer.close()
 
 if __name__ == "__main__":
     main()
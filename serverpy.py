@@ -8,6 +8,9 @@
     # Link: https://docs.python.org/3/library/json.html
     
 import socket
+import sys
+
+from address import listen
 
 # We need specific the port detials
 # Client sends JSON with server_ip '127.0.0.1
@@ -16,13 +19,13 @@ _connection_port = 7000
 _max_buffersize = 1024
 
 
+# Optional first argument: where to listen, "host:port" (TCP) or "unix:/path" (Unix socket)
+listen_address = sys.argv[1] if len(sys.argv) > 1 else f"{services_ip}:{_connection_port}"
+
 # Trying to creative a new TCP. Using the socket 
 # Reference: https://www.geeksforgeeks.org/socket-programming-python/
-with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as socket_of_server:
-    socket_of_server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    socket_of_server.bind((services_ip, _connection_port))
-    socket_of_server.listen(1)
-    print(f"Server is listening on port {_connection_port}...")
+with listen(listen_address, backlog=1) as socket_of_server:
+    print(f"Server is listening on {listen_address}...")
 
     # Handling error, if we can't accept from the connection! 
     try:
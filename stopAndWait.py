@@ -1,7 +1,12 @@
 #!/usr/bin/env python3
+import os
 import socket
-import struct
 import time
+
+from compress import compressed_chunks, negotiate, stream_size_bound
+from metrics import DelayStats, packet_count, send_time_buffer
+from packet import DATA_SIZE, FLAG_ACK, FLAG_FIN, PACKET_SIZE, PacketWriter, recv_ack
+from pkttrace import SEND, RETRANSMIT, ACK, DUP_ACK, TIMEOUT, ACKED
 '''
     Stop and wait protocal 
     
@@ -19,23 +24,12 @@ import time
         1, Correct number of packets sent (3 Points):
             For each file chunk, exactly one data packet is sent (plus one EOF packet).
         2. Sequence of packets managed correctly (3 Points):
-            Each packet is constructed with a 4-byte sequence number (using file offset).
+            Each packet carries the file offset as its sequence number in a versioned
+            header with a 64-bit offset field (see packet.py).
         3. Metrics measured correctly over 10 iterations (3 Points):
             Throughput, average delay, and a performance metric are computed.
 '''
 
-# Initial the variables
-PACKET_SIZE = 1024              # Total packet size in bytes
-SEQ_ID_SIZE = 4                 # 4 bytes reserved for the sequence number
-DATA_SIZE = PACKET_SIZE - SEQ_ID_SIZE  # Payload size per packet
-
-def create_packet(seq, data):
-    """
-    Create a UDP packet with a 4-byte sequence number header (signed, big-endian)
-    followed by the data.
-    """
-    return seq.to_bytes(SEQ_ID_SIZE, byteorder='big', signed=True) + data
-
 def read_file_in_chunks(filename):
     """
     Generator that reads the file in DATA_SIZE chunks.
@@ -51,21 +45,33 @@ def read_file_in_chunks(filename):
             offset += len(data)
 
 class StopAndWaitSenderWithMetrics:
-    def __init__(self, dest_ip, dest_port=5001, timeout=0.5):
-        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        # Enable address reuse to avoid "address already in use" errors.
-        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        self.sock.bind(("0.0.0.0", 5002))  # Bind to a port different from the receiver's (5001)
+    def __init__(self, dest_ip, dest_port=5001, timeout=0.5, sock=None, clock=time.time, tracer=None, legacy=False,
+                 compress=None):
+        if compress and legacy:
+            raise ValueError("compression needs the versioned header; it cannot be combined with legacy=True")
+        # A socket-like object (e.g. netem.EmulatedSocket) can be passed in place of a real UDP socket,
+        # together with the clock that drives it.
+        if sock is None:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            # Enable address reuse to avoid "address already in use" errors.
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.bind(("0.0.0.0", 5002))  # Bind to a port different from the receiver's (5001)
+        self.sock = sock
         self.sock.settimeout(timeout)
+        self.clock = clock
+        self.tracer = tracer           # Optional pkttrace.TraceRecorder
         self.dest_addr = (dest_ip, dest_port)
+        # Packets are built in one reused buffer; legacy=True speaks the old 4-byte-offset format
+        self.writer = PacketWriter(legacy=legacy)
+        self.compress = compress       # Requested codec ("zlib" / "lzma"), or None to send the file as is
         
         # Start timer for throughput measurement (immediately after socket creation)
-        self.start_time = time.time()
+        self.start_time = self.clock()
         
         # Metrics variables
         self.total_bytes_sent = 0      # Count unique payload bytes successfully acknowledged
-        self.packet_send_time = {}     # Dictionary: packet offset -> first send time
-        self.packet_delays = []        # List to hold per-packet delays
+        self.packet_send_time = None   # array('d'): packet number (offset // DATA_SIZE) -> first send time
+        self.delay_stats = DelayStats()  # Running mean and p50/p99 of per-packet delay
 
 
     """
@@ -83,32 +89,47 @@ class StopAndWaitSenderWithMetrics:
     - After transmission, throughput, average delay, and performance metric are computed.
     """
     def send_file(self, filename):
-        for offset, data in read_file_in_chunks(filename):
-            packet = create_packet(offset, data)
-            # Record the first send time only once per packet
-            if offset not in self.packet_send_time:
-                self.packet_send_time[offset] = time.time()
+        # Optional compression, agreed with the receiver before any data is sent (see compress.py)
+        codec = negotiate(self.sock, self.writer, self.dest_addr, self.compress) if self.compress else None
+        chunks = read_file_in_chunks(filename) if codec is None else compressed_chunks(filename, codec)
+        size = os.path.getsize(filename)
+        self.packet_send_time = send_time_buffer(packet_count(size if codec is None else stream_size_bound(size),
+                                                              DATA_SIZE))
+        for offset, data in chunks:
+            packet = self.writer.pack(offset, data)
+            # Record the first send time only once per packet (retransmits stay inside the loop below)
+            self.packet_send_time[offset // DATA_SIZE] = self.clock()
             # Stop-and-wait: send the packet and wait for its ACK
+            event = SEND
             while True:
                 self.sock.sendto(packet, self.dest_addr)
+                if self.tracer is not None:
+                    self.tracer.record(event, self.clock(), offset, len(data))
                 # print(f"[StopAndWait] Sent packet: seq_id {offset}, size {len(data)} bytes")
                 try:
-                    ack_packet, _ = self.sock.recvfrom(PACKET_SIZE)
-                    ack = int.from_bytes(ack_packet[:SEQ_ID_SIZE], byteorder='big', signed=True)
+                    ack = recv_ack(self.sock, self.writer.session_id, self.writer.legacy)
                     # Expect cumulative ACK to be at least offset + len(data)
                     if ack >= offset + len(data):
-                        delay = time.time() - self.packet_send_time[offset]
-                        self.packet_delays.append(delay)
+                        delay = self.clock() - self.packet_send_time[offset // DATA_SIZE]
+                        self.delay_stats.add(delay)
                         self.total_bytes_sent += len(data)
+                        if self.tracer is not None:
+                            now = self.clock()
+                            self.tracer.record(ACK, now, ack)
+                            self.tracer.record(ACKED, now, offset, len(data), delay)
                         # print(f"[StopAndWait] Received ACK: {ack}, delay: {delay:.4f} s")
                         break
+                    if self.tracer is not None:
+                        self.tracer.record(DUP_ACK, self.clock(), ack)
                 except socket.timeout:
-                    pass
+                    if self.tracer is not None:
+                        self.tracer.record(TIMEOUT, self.clock(), offset)
                     # print(f"[StopAndWait] Timeout for packet {offset}. Resending...")
+                event = RETRANSMIT
         
         # Send an EOF packet (empty payload) with the final offset
         eof_offset = offset + len(data) if 'data' in locals() else 0
-        eof_packet = create_packet(eof_offset, b"")
+        eof_packet = self.writer.pack(eof_offset)
         self.sock.sendto(eof_packet, self.dest_addr)
         # print(f"[StopAndWait] Sent EOF packet with seq_id {eof_offset}")
         
@@ -122,16 +143,19 @@ class StopAndWaitSenderWithMetrics:
             # print("[StopAndWait] Timeout waiting for final ACK/FIN.")
         
         # Send FINACK message to signal receiver exit
-        finack_packet = create_packet(0, b'==FINACK==')
+        finack_packet = self.writer.pack(0, flags=FLAG_FIN | FLAG_ACK)
         self.sock.sendto(finack_packet, self.dest_addr)
         # print("[StopAndWait] Sent FINACK message. Exiting sender.")
         self.sock.close()
         
         # Calculate metrics
-        end_time = time.time()
+        end_time = self.clock()
         total_time = end_time - self.start_time
-        throughput = self.total_bytes_sent / total_time if total_time > 0 else 0.0
-        avg_delay = sum(self.packet_delays) / len(self.packet_delays) if self.packet_delays else 0.0
+        # Throughput counts file bytes delivered. With compression, total_bytes_sent is the
+        # (smaller) frame stream on the wire, and the whole file is delivered once it is all ACKed.
+        delivered = self.total_bytes_sent if codec is None else os.path.getsize(filename)
+        throughput = delivered / total_time if total_time > 0 else 0.0
+        avg_delay = self.delay_stats.mean()
         
         # Corrected performance metric:
         # 0.3 × (throughput / 1000) + 0.7 / (average per-packet delay)
@@ -145,4 +169,5 @@ class StopAndWaitSenderWithMetrics:
             delay (in seconds), and the performance metric separated by a comma. All numbers should be reported
             as floating points, rounded up to 7 decimal points with no units.
         '''
-        print(f"{throughput:.7f}, {avg_delay:.7f}, {performance_metric:.7f}")
\ No newline at end of file
+        print(f"{throughput:.7f}, {avg_delay:.7f}, {performance_metric:.7f}")
+        return throughput, avg_delay, performance_metric
@@ -1,12 +1,12 @@
+import os
 import socket
 import time
 
-PACKET_SIZE = 1024
-SEQ_ID_SIZE = 4
-DATA_SIZE = PACKET_SIZE - SEQ_ID_SIZE
-
-def create_packet(seq, data):
-    return seq.to_bytes(SEQ_ID_SIZE, byteorder='big', signed=True) + data
+from fec import MAX_DATAGRAM, RECOVERED, AdaptiveRedundancy, FecEncoder
+from compress import compressed_chunks, negotiate
+from metrics import DelayStats, send_time_buffer
+from packet import DATA_SIZE, FLAG_ACK, FLAG_FEC, FLAG_FIN, PACKET_SIZE, PacketWriter, recv_ack_packet
+from pkttrace import SEND, RETRANSMIT, ACK, DUP_ACK, TIMEOUT, CWND, ACKED, REPAIR
 
 def read_file_in_chunks(filename):
     with open(filename, 'rb') as f:
@@ -19,41 +19,103 @@ def read_file_in_chunks(filename):
             offset += len(data)
 
 class TcpRenoSenderWithMetrics:
-    def __init__(self, dest_ip, dest_port=5001, timeout=0.5):
-        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        self.sock.bind(("0.0.0.0", 5002))
+    def __init__(self, dest_ip, dest_port=5001, timeout=0.5, sock=None, clock=time.time, tracer=None, legacy=False,
+                 fec=False, compress=None):
+        if fec and legacy:
+            raise ValueError("FEC needs the versioned header; it cannot be combined with legacy=True")
+        if compress and legacy:
+            raise ValueError("compression needs the versioned header; it cannot be combined with legacy=True")
+        if sock is None:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.bind(("0.0.0.0", 5002))
+        self.sock = sock
         self.sock.settimeout(timeout)
+        self.clock = clock
+        self.tracer = tracer        # Optional pkttrace.TraceRecorder
         self.dest_addr = (dest_ip, dest_port)
-        self.start_time = time.time()
+        # Reused packet buffer (see packet.py); repair packets are slightly larger than data packets
+        self.writer = PacketWriter(legacy=legacy, capacity=MAX_DATAGRAM if fec else PACKET_SIZE)
+        self.start_time = self.clock()
         self.total_bytes_sent = 0
-        self.packet_send_time = {}  # Records send times by packet offset
-        self.packet_delays = []     # List of computed delays
+        self.packet_send_time = None      # array('d'): packet index -> latest send time
+        self.delay_stats = DelayStats()   # Running mean and p50/p99 of per-packet delay
+        self.compress = compress          # Requested codec ("zlib" / "lzma"), or None to send the file as is
         # TCP Reno parameters:
         self.cwnd = 1          # Congestion window (in packets)
         self.ssthresh = 64     # Slow-start threshold (in packets)
         self.last_ack = -1
         self.dup_ack_count = 0
+        # Forward error correction (see fec.py): one XOR repair packet per block of new packets
+        self.encoder = FecEncoder() if fec else None
+        self.redundancy = AdaptiveRedundancy() if fec else None
+        self.recovered = 0      # Receiver's count of packets rebuilt from repairs, as last reported
+        self.losses = 0         # Losses seen since the last repair packet (retransmits + rebuilt)
+
+    def _trace_cwnd(self):
+        self.tracer.record(CWND, self.clock(), int(self.ssthresh), 0, self.cwnd)
+
+    def _send_repair(self):
+        count = len(self.encoder)
+        block = self.encoder.flush()
+        if block is None:
+            return
+        start, payload = block
+        self.sock.sendto(self.writer.pack(start, payload, FLAG_FEC), self.dest_addr)
+        if self.tracer is not None:
+            self.tracer.record(REPAIR, self.clock(), start, count)
+        # Re-estimate the loss rate once per block and resize the next one
+        self.redundancy.update(count, self.losses)
+        self.losses = 0
+
+    def _dup_ack_threshold(self):
+        # With FEC, a loss is normally repaired once the rest of its block and the
+        # repair packet arrive, so give the repair that many dup ACKs before retransmitting.
+        if self.encoder is None:
+            return 3
+        return 3 + self.redundancy.block_size()
 
     def send_file(self, filename):
-        packets = list(read_file_in_chunks(filename))
+        # Optional compression, agreed with the receiver before any data is sent (see compress.py)
+        codec = negotiate(self.sock, self.writer, self.dest_addr, self.compress) if self.compress else None
+        chunks = read_file_in_chunks(filename) if codec is None else compressed_chunks(filename, codec)
+        packets = list(chunks)
         total_packets = len(packets)
+        self.packet_send_time = send_time_buffer(total_packets)
         base = 0
         next_index = 0
+        sent_upto = 0   # Packets below this index have been sent at least once
+        if self.tracer is not None:
+            self._trace_cwnd()
 
         while base < total_packets:
             # Send new packets while within the current congestion window.
             while next_index < total_packets and (next_index - base) < self.cwnd:
                 offset, data = packets[next_index]
                 # Always update the send time for accurate delay measurement.
-                self.packet_send_time[offset] = time.time()
-                packet = create_packet(offset, data)
+                self.packet_send_time[next_index] = self.clock()
+                packet = self.writer.pack(offset, data)
                 self.sock.sendto(packet, self.dest_addr)
+                first = next_index >= sent_upto
+                if self.tracer is not None:
+                    self.tracer.record(SEND if first else RETRANSMIT, self.clock(), offset, len(data))
                 next_index += 1
+                if first:
+                    sent_upto = next_index
+                    if self.encoder is not None:
+                        self.encoder.add(offset, data)
+                        if len(self.encoder) >= self.redundancy.block_size() or sent_upto == total_packets:
+                            self._send_repair()
 
             try:
-                ack_packet, _ = self.sock.recvfrom(PACKET_SIZE)
-                ack = int.from_bytes(ack_packet[:SEQ_ID_SIZE], byteorder='big', signed=True)
+                reply = recv_ack_packet(self.sock, self.writer.session_id, self.writer.legacy)
+                ack = reply.offset
+                if self.encoder is not None and len(reply.payload) >= RECOVERED.size:
+                    recovered = RECOVERED.unpack_from(reply.payload)[0]
+                    self.losses += max(recovered - self.recovered, 0)
+                    self.recovered = max(recovered, self.recovered)
+                if self.tracer is not None:
+                    self.tracer.record(ACK, self.clock(), ack)
                 if ack > self.last_ack:
                     self.dup_ack_count = 0
                     self.last_ack = ack
@@ -62,12 +124,11 @@ class TcpRenoSenderWithMetrics:
                         offset, data = packets[base]
                         # If ACK acknowledges this packet
                         if ack >= offset + len(data):
-                            # Safeguard: if the send time is missing, record it now.
-                            if offset not in self.packet_send_time:
-                                self.packet_send_time[offset] = time.time()
-                            delay = time.time() - self.packet_send_time[offset]
-                            self.packet_delays.append(delay)
+                            delay = self.clock() - self.packet_send_time[base]
+                            self.delay_stats.add(delay)
                             self.total_bytes_sent += len(data)
+                            if self.tracer is not None:
+                                self.tracer.record(ACKED, self.clock(), offset, len(data), delay)
                             base += 1
                         else:
                             break
@@ -76,34 +137,48 @@ class TcpRenoSenderWithMetrics:
                         self.cwnd += 1
                     else:
                         self.cwnd += 1.0 / self.ssthresh
+                    if self.tracer is not None:
+                        self._trace_cwnd()
                 else:
                     # Duplicate ACK received.
                     self.dup_ack_count += 1
-                    if self.dup_ack_count == 3:
+                    if self.tracer is not None:
+                        self.tracer.record(DUP_ACK, self.clock(), ack, 0, self.dup_ack_count)
+                    if self.dup_ack_count >= self._dup_ack_threshold():
                         # Fast retransmit and recovery.
+                        self.losses += 1
                         self.ssthresh = max(self.cwnd // 2, 1)
                         self.cwnd = self.ssthresh + 3
                         self.dup_ack_count = 0
                         offset, data = packets[base]
                         # Update send time unconditionally.
-                        self.packet_send_time[offset] = time.time()
-                        packet = create_packet(offset, data)
+                        self.packet_send_time[base] = self.clock()
+                        packet = self.writer.pack(offset, data)
                         self.sock.sendto(packet, self.dest_addr)
+                        if self.tracer is not None:
+                            self._trace_cwnd()
+                            self.tracer.record(RETRANSMIT, self.clock(), offset, len(data))
             except socket.timeout:
                 # Timeout occurred; assume packet loss and retransmit the packet at base.
                 # print(f"[TCP Reno] Timeout occurred. Retransmitting packet at base index {base}.")
                 self.ssthresh = max(self.cwnd // 2, 1)
                 self.cwnd = 1
+                self.losses += 1
                 offset, data = packets[base]
                 # Update send time unconditionally.
-                self.packet_send_time[offset] = time.time()
-                packet = create_packet(offset, data)
+                self.packet_send_time[base] = self.clock()
+                packet = self.writer.pack(offset, data)
                 self.sock.sendto(packet, self.dest_addr)
+                if self.tracer is not None:
+                    now = self.clock()
+                    self.tracer.record(TIMEOUT, now, offset)
+                    self._trace_cwnd()
+                    self.tracer.record(RETRANSMIT, now, offset, len(data))
                 next_index = base  # Reset next_index to resend unACKed packets.
 
         # Send an EOF packet (empty payload) with the final sequence number.
         final_offset = packets[-1][0] + len(packets[-1][1]) if total_packets > 0 else 0
-        eof_packet = create_packet(final_offset, b"")
+        eof_packet = self.writer.pack(final_offset)
         self.sock.sendto(eof_packet, self.dest_addr)
 
         try:
@@ -114,15 +189,18 @@ class TcpRenoSenderWithMetrics:
             pass
             # print("[TCP Reno] Timeout waiting for final ACK/FIN.")
 
-        finack_packet = create_packet(0, b'==FINACK==')
+        finack_packet = self.writer.pack(0, flags=FLAG_FIN | FLAG_ACK)
         self.sock.sendto(finack_packet, self.dest_addr)
         self.sock.close()
 
         # Compute and print performance metrics.
-        end_time = time.time()
+        end_time = self.clock()
         total_time = end_time - self.start_time
-        throughput = self.total_bytes_sent / total_time if total_time > 0 else 0.0
-        avg_delay = sum(self.packet_delays) / len(self.packet_delays) if self.packet_delays else 0.0
+        # Throughput counts file bytes delivered. With compression, total_bytes_sent is the
+        # (smaller) frame stream on the wire, and the whole file is delivered once it is all ACKed.
+        delivered = self.total_bytes_sent if codec is None else os.path.getsize(filename)
+        throughput = delivered / total_time if total_time > 0 else 0.0
+        avg_delay = self.delay_stats.mean()
         if avg_delay > 0:
             performance_metric = 0.3 * (throughput / 1000.0) + 0.7 / avg_delay
         else:
@@ -135,8 +213,9 @@ class TcpRenoSenderWithMetrics:
         '''
         # Output the metrics; note that 10 iterations may be run externally and averaged.
         print(f"{throughput:.7f}, {avg_delay:.7f}, {performance_metric:.7f}")
+        return throughput, avg_delay, performance_metric
         # print("========== Metrics ==========")
         # print(f"Throughput: {throughput:.2f} bytes/s")
         # print(f"Average delay per packet: {avg_delay:.4f} s")
         # print(f"Performance Metric: {performance_metric:.4f}")
-        # print("============================")
\ No newline at end of file
+        # print("============================")
@@ -0,0 +1,27 @@
+import pytest
+
+from packet import FLAG_ACK, HEADER_SIZE, PacketFormatError, PacketWriter, parse
+
+
+def test_round_trip():
+    packet = bytes(PacketWriter(session_id=7).pack(4096, b"hello", FLAG_ACK))
+    assert parse(packet) == (FLAG_ACK, 4096, 7, b"hello", False)
+
+
+def test_truncated_payload_is_rejected():
+    packet = bytes(PacketWriter(session_id=7).pack(0, b"hello"))
+    with pytest.raises(PacketFormatError):
+        parse(packet[:-1])
+    with pytest.raises(PacketFormatError):
+        parse(packet[:HEADER_SIZE])
+
+
+def test_trailing_bytes_are_rejected():
+    packet = bytes(PacketWriter(session_id=7).pack(0, b"hello"))
+    with pytest.raises(PacketFormatError):
+        parse(packet + b"x")
+
+
+def test_runt_legacy_datagram_is_rejected():
+    with pytest.raises(PacketFormatError):
+        parse(b"\x00\x01")
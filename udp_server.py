@@ -2,6 +2,8 @@
 import socket
 import time
 
+from batchrecv import BatchReceiver
+
 def main():
     SERVER_IP = '127.0.0.1'
     SERVER_PORT = 5005
@@ -11,8 +13,11 @@ def main():
     server_sock.bind((SERVER_IP, SERVER_PORT))
     print(f"Server started on {SERVER_IP}:{SERVER_PORT}")
 
-    metadata_packet, client_addr = server_sock.recvfrom(4096)
-    metadata = metadata_packet.decode()
+    # Datagrams are read in batches into reused buffers, each with its kernel arrival time
+    batcher = BatchReceiver(server_sock, BUFFER_SIZE)
+    packets = batcher.packets(batcher.receive())
+    metadata_packet, client_addr, metadata_arrival = next(packets)
+    metadata = bytes(metadata_packet).decode()
     print(f"Received metadata from client {client_addr}: {metadata}")
 
     # Use split with a maxsplit of 2 so that the timestamp is preserved even if it contains colons.
@@ -30,16 +35,29 @@ def main():
     print(f"Metadata indicates a payload size of {total_bytes_expected} bytes.")
     print(f"Client timestamp: {client_timestamp}")
     
-    start_time = time.time()
+    # Timing uses kernel arrival times: from the metadata packet to the last payload packet
+    start_time = metadata_arrival
+    end_time = metadata_arrival
     total_received = 0
+    previous_gap = None
+    jitter = 0.0    # Smoothed variation of inter-arrival gaps (RFC 3550 style, gain 1/16)
 
-    while total_received < total_bytes_expected:
-        data, addr = server_sock.recvfrom(BUFFER_SIZE)
-        total_received += len(data)
+    while True:
+        # The rest of the metadata batch first, then one batch per receive()
+        for data, addr, arrival in packets:
+            total_received += len(data)
+            gap = arrival - end_time
+            if previous_gap is not None:
+                jitter += (abs(gap - previous_gap) - jitter) / 16
+            previous_gap = gap
+            end_time = arrival
+        if total_received >= total_bytes_expected:
+            break
+        packets = batcher.packets(batcher.receive())
 
-    end_time = time.time()
     elapsed_time = end_time - start_time
-    throughput_kbps = (total_received / elapsed_time) / 1024.0 
+    # One datagram (or SIZE:0) gives first and last timestamps that are equal
+    throughput_kbps = (total_received / elapsed_time) / 1024.0 if elapsed_time > 0 else 0.0
     #The throughput is calculated in KB
     # and the server calculates the throughput correctly, i.e., the formula is correctly implemented
 
@@ -47,6 +65,8 @@ def main():
     print(f"Total bytes received: {total_received}")
     print(f"Time taken: {elapsed_time:.2f} seconds")
     print(f"Throughput: {throughput_kbps:.2f} KB/s")
+    print(f"Inter-arrival jitter: {jitter * 1000:.4f} ms "
+          f"({'kernel' if batcher.kernel_timestamps else 'user-space'} timestamps)")
     print(f"Client IP: {client_addr[0]}, Server IP: {SERVER_IP}")
 
     throughput_message = f"{throughput_kbps:.2f}"
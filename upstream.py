@@ -0,0 +1,117 @@
+import json
+import random
+import threading
+import time
+
+from address import connect, parse_address
+'''
+    Named upstream pools for proxy_server.py
+
+    Instead of naming server_ip/server_port, a client can send {"pool": "name", ...}
+    and the proxy picks a member of that pool:
+
+        balancing       power of two choices: sample two healthy members, take
+                        the one with fewer outstanding requests
+        health          passive only. Connect failures, response timeouts and
+                        errors count against a member; max_failures in a row
+                        eject it for base_ejection seconds, doubling on every
+                        further ejection up to max_ejection. A success resets both.
+        failover        connects use a short connect_timeout, and a member
+                        that fails to connect is skipped for the next
+                        healthy one within the same request
+        panic mode      if every member is ejected, all of them are tried anyway
+
+    Config file (proxy_server.py --config pools.json):
+        {"pools": {"pong": {"members": ["127.0.0.1:7000", "unix:/tmp/pong.sock"],
+                            "connect_timeout": 0.25, "response_timeout": 5.0,
+                            "max_failures": 3, "base_ejection": 1.0, "max_ejection": 30.0}}}
+'''
+
+
+class NoHealthyBackend(OSError):
+    pass
+
+
+class Backend:
+    def __init__(self, addr):
+        self.addr = addr        # address.Address: TCP or Unix socket
+        self.outstanding = 0    # Requests currently using this member
+        self.failures = 0       # Consecutive failures
+        self.ejections = 0      # Consecutive ejections, for the backoff
+        self.ejected_until = 0.0
+
+    def __repr__(self):
+        return str(self.addr)
+
+
+class UpstreamPool:
+    def __init__(self, name, members, connect_timeout=0.25, response_timeout=5.0, max_failures=3,
+                 base_ejection=1.0, max_ejection=30.0, clock=time.monotonic):
+        if not members:
+            raise ValueError(f"pool {name!r} has no members")
+        self.name = name
+        self.backends = [Backend(parse_address(addr)) for addr in members]
+        self.connect_timeout = connect_timeout
+        self.response_timeout = response_timeout
+        self.max_failures = max_failures
+        self.base_ejection = base_ejection
+        self.max_ejection = max_ejection
+        self.clock = clock
+        self._lock = threading.Lock()   # The proxy serves each client on its own thread
+
+    def _pick(self, tried):
+        now = self.clock()
+        candidates = [b for b in self.backends if b not in tried]
+        healthy = [b for b in candidates if b.ejected_until <= now]
+        candidates = healthy or candidates
+        if len(candidates) < 2:
+            return candidates[0] if candidates else None
+        first, second = random.sample(candidates, 2)
+        return first if first.outstanding <= second.outstanding else second
+
+    def _failed(self, backend):
+        backend.failures += 1
+        if backend.failures >= self.max_failures:
+            backoff = min(self.base_ejection * 2 ** backend.ejections, self.max_ejection)
+            backend.ejected_until = self.clock() + backoff
+            backend.ejections += 1
+            backend.failures = 0
+            print(f"Pool {self.name}: ejecting {backend} for {backoff:g} s")
+
+    def connect(self):
+        """Connected socket to a member, failing over on connect errors. Returns (backend, socket)."""
+        tried = set()
+        while True:
+            with self._lock:
+                backend = self._pick(tried)
+                if backend is None:
+                    raise NoHealthyBackend(f"no backend of pool {self.name!r} accepted the connection")
+                backend.outstanding += 1
+            tried.add(backend)
+            try:
+                sock = connect(backend.addr, timeout=self.connect_timeout)
+            except OSError:
+                self.release(backend, ok=False)
+                continue
+            sock.settimeout(self.response_timeout)
+            return backend, sock
+
+    def release(self, backend, ok):
+        with self._lock:
+            backend.outstanding -= 1
+            if ok:
+                backend.failures = 0
+                backend.ejections = 0
+            else:
+                self._failed(backend)
+
+
+def load_pools(path):
+    """{pool name: UpstreamPool} from a JSON config file."""
+    with open(path) as f:
+        config = json.load(f)
+    pools = {}
+    for name, options in config.get("pools", {}).items():
+        options = dict(options)
+        pools[name] = UpstreamPool(name, options.pop("members"), **options)
+    return pools